@@ -1,17 +1,22 @@
 import streamlit as st
-import google.generativeai as genai
-from pypdf import PdfReader
-import os
-import base64
-import time
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import json
-import io
-import re
-import random
+import os
+
+from barelvox.assets import manifest
+from barelvox.backends import get_backend
+from barelvox.engine import COUNCIL_STAGES, P_CHAT_AVENOR, call_gemini_resilient, chat_payload, run_council, trinity_flags, verdict_flag
+from barelvox.extraction import extract_cache
+from barelvox.jobs import jobs
+from barelvox.llm_cache import LLM_CACHE_ENABLED, llm_cache
+from barelvox.metrics import registry
+from barelvox.package import PACKAGE_STAGES, describe, describe_unreadable, expand_uploads, run_package
+from barelvox.scheduler import scheduler
+from barelvox.pipeline import progress_after
 
 # --- CONFIGURATION PAGE ---
 # Fallback Favicon : Si pas de fichier, on utilise un emoji
-page_icon = "assets/favicon.ico" if os.path.exists("assets/favicon.ico") else "🏗️"
+page_icon = manifest.path("favicon") or "🏗️"
 
 st.set_page_config(
     page_title="BAREL VOX - Council OEE",
@@ -20,9 +25,6 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# --- CONFIGURATION MOTEUR ---
-MODEL_NAME = "gemini-2.0-flash"
-
 # --- ETAT DE SESSION ---
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -36,6 +38,24 @@ if "messages" not in st.session_state:
 if "verdict_color" not in st.session_state: st.session_state.verdict_color = "neutral"
 if "analysis_complete" not in st.session_state: st.session_state.analysis_complete = False
 if "full_context" not in st.session_state: st.session_state.full_context = ""
+if "dce_index" not in st.session_state: st.session_state.dce_index = None
+if "last_trace" not in st.session_state: st.session_state.last_trace = None
+if "job_error" not in st.session_state: st.session_state.job_error = None
+if "submitted_file" not in st.session_state: st.session_state.submitted_file = None
+
+# Analyse en tâche de fond : après un rechargement d'onglet, on la retrouve par l'URL
+if "job_id" not in st.session_state:
+    st.session_state.job_id = st.query_params.get("job")
+    resumed = jobs.get(st.session_state.job_id)
+    if resumed is None:
+        st.session_state.job_id = None
+        st.query_params.pop("job", None)
+    else:
+        st.session_state.messages.append({"role": "user", "name": "User", "avatar": "user", "content": f"Dossier : {resumed.label}"})
+
+# Identifiant de session : équité de la file d'attente des appels modèle
+script_ctx = get_script_run_ctx()
+session_id = script_ctx.session_id if script_ctx else None
 
 # --- SYSTÈME D'AVATARS & ASSETS (Gestion Majuscule Krypt) ---
 EMOJI_MAP = {
@@ -45,39 +65,12 @@ EMOJI_MAP = {
 }
 
 def get_avatar_safe(key):
-    """Renvoie un chemin valide ou un emoji. Gère le cas Krypt majuscule."""
-    # Cas Spécial KRYPT (Majuscule force)
-    if key.lower() == "krypt":
-        if os.path.exists("assets/Krypt.png"): return "assets/Krypt.png"
-        if os.path.exists("assets/Krypt.jpg"): return "assets/Krypt.jpg"
-    
-    # Cas général
-    for name in [key, key.lower(), key.capitalize()]:
-        for ext in [".png", ".jpg", ".jpeg", ".ico"]:
-            path = f"assets/{name}{ext}"
-            if os.path.exists(path): return path
-            
-    # Fallback Emoji
-    return EMOJI_MAP.get(key.lower(), "🤖")
-
-def get_img_as_base64(file_path):
-    try:
-        if not os.path.exists(file_path): return None
-        with open(file_path, "rb") as f:
-            data = f.read()
-        return base64.b64encode(data).decode()
-    except:
-        return None
+    """Renvoie un chemin valide ou un emoji (manifeste : Krypt.png, "evena .png", etc.)."""
+    return manifest.path(key) or EMOJI_MAP.get(key.lower(), "🤖")
 
 def get_avatar_b64_safe(key):
-    """Pour le HTML du Header/Council"""
-    path = get_avatar_safe(key)
-    # Si c'est un path image, on convertit en B64
-    if path and not path in EMOJI_MAP.values() and os.path.exists(path):
-        b64 = get_img_as_base64(path)
-        if b64: return f"data:image/png;base64,{b64}"
-    # Sinon URL générique
-    return f"https://ui-avatars.com/api/?name={key}&background=333&color=fff&size=128"
+    """Pour le HTML du Header/Council (data URI en cache process, placeholder local sinon)"""
+    return manifest.data_uri(key)
 
 # --- CSS DYNAMIQUE ---
 glow_color = "transparent"
@@ -90,7 +83,7 @@ st.markdown(f"""
     /* UI Hacks */
     [data-testid='stFileUploader'] section > div > div > span {{ display: none; }}
     [data-testid='stFileUploader'] section > div > div::after {{
-        content: "Glissez le dossier DCE (PDF) ici ou cliquez pour parcourir";
+        content: "Glissez le dossier DCE (PDF ou ZIP) ici ou cliquez pour parcourir";
         color: #E85D04; font-weight: bold; display: block; margin-top: 10px; font-family: 'Helvetica Neue', sans-serif;
     }}
     [data-testid='stFileUploader'] section > div > div > small {{ display: none; }}
@@ -180,135 +173,173 @@ st.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
-# --- ENGINE ---
-def extract_text_from_bytes(pdf_bytes):
-    try:
-        pdf_file = io.BytesIO(pdf_bytes)
-        reader = PdfReader(pdf_file)
-        text = ""
-        for page in reader.pages:
-            txt_page = page.extract_text()
-            if txt_page:
-                clean_page = re.sub(r'(?<!\n)\n(?!\n)', ' ', txt_page)
-                text += clean_page + "\n\n"
-        return text
-    except Exception as e:
-        return f"Erreur lecture PDF : {str(e)}"
-
-def clean_gemini_json(text):
-    """Extraction Blindée Anti-Crash (Liste vs Dict)"""
-    try:
-        text = text.replace("```json", "").replace("```", "").strip()
-        
-        # 1. Regex pour trouver le JSON pur
-        match = re.search(r"(\{.*\}|\[.*\])", text, re.DOTALL)
-        if match:
-            json_str = match.group()
-            data = json.loads(json_str)
-            
-            # CORRECTIF CRITIQUE : Si c'est une liste, on prend le 1er élément
-            if isinstance(data, list):
-                if len(data) > 0: return data[0]
-                else: return None
-            return data
-            
-        # 2. Tentative directe
-        data = json.loads(text)
-        if isinstance(data, list): 
-             if len(data) > 0: return data[0]
-             return None
-        return data
-
-    except:
-        return None
-
-def call_gemini_resilient(role_prompt, data_part, is_pdf, agent_name, output_json=False, status_placeholder=None):
-    model = genai.GenerativeModel(MODEL_NAME, generation_config={"response_mime_type": "application/json"} if output_json else {})
-    
-    final_content = ""
-    if is_pdf:
-        extracted_text = extract_text_from_bytes(data_part)
-        final_content = f"{role_prompt}\n\n---\n\nCONTENU DU DCE (EXTRAIT):\n{extracted_text}"
+def stage_log_html(stage, elapsed, ctx):
+    """Ligne de log d'une étape terminée (durée mesurée)."""
+    d = f"{elapsed:.1f}s"
+    if stage.key == "evena":
+        stats = ctx["dce_stats"]
+        line = f"✅ Evena : Lecture Terminée ({d}) - {stats['pages']} pages"
+        if "documents" in ctx:
+            line += f" - {len(ctx['documents'])} pièce(s) lue(s)"
+            for sub in ctx["documents"]:
+                line += f"<br>- {describe(sub['document'])}"
+            if ctx["skipped"]:
+                line += f"<br>- Écartées : {', '.join(describe(doc) for doc in ctx['skipped'])}"
+        return line
+    if stage.key == "keres":
+        errors = ctx["dce_stats"]["errors"]
+        warn = f" - {errors} page(s) illisible(s) ignorée(s)" if errors else ""
+        if ctx.get("unreadable"):
+            warn += "".join(f"<br>- Non analysée : {describe_unreadable(item)}" for item in ctx["unreadable"])
+        scan = ctx.get("prescan")
+        if scan is not None:
+            warn += f"<br>- Pré-scan : {len(scan.candidates)} paragraphe(s) citant une marque, dont {len(scan.without_equivalent)} sans \"ou équivalent\""
+        return f"✅ Kérès : Données sécurisées ({d}){warn}"
+    if stage.key == "trinite":
+        flags = trinity_flags(ctx["trinity_res"])
+        l_flag, e_flag, k_flag = flags["liorah"], flags["ethan"], flags["krypt"]
+        n = ctx.get("trinity_chunks", 1)
+        seg = f" - {n} segments" if n > 1 else (" - pré-scan déterministe" if n == 0 else "")
+        if ctx.get("trinity_reused"):
+            seg += f" ({ctx['trinity_reused']} déjà analysé(s), repris)"
+        return f"✅ Trinité : Rapports Validés ({d}){seg}<br>- Juridique : {l_flag} | Risques : {e_flag} | Data : {k_flag}"
+    if stage.key == "phoebe":
+        return f"✅ Phoebe : Synthèse prête ({d})"
+    if stage.key == "avenor":
+        return f"✅ Avenor : Verdict rendu ({d})"
+    return f"✅ {stage.name} : Terminé ({d})"
+
+def without_flags(text):
+    return text.replace("[FLAG : 🔴]", "").replace("[FLAG : 🟠]", "").replace("[FLAG : 🟢]", "")
+
+def stream_preview(placeholder):
+    """Callback de streaming : affiche le texte reçu au fil de l'eau, curseur en fin."""
+    def on_token(text):
+        placeholder.markdown(without_flags(text) + " ▌", unsafe_allow_html=True)
+    return on_token
+
+# --- ANALYSES EN TÂCHE DE FOND ---
+# Rafraîchissement du suivi (s) : seul le fragment de progression est relancé
+JOB_POLL_SECONDS = float(os.environ.get("BAREL_JOB_POLL", "1"))
+
+def council_job(files, name, use_cache, pacing, session_id):
+    """Tâche du pool : aucun appel Streamlit, tout l'avancement passe par le Job.
+
+    `files` : [(nom, bytes)] déposés. Un seul PDF suit le Council historique ;
+    plusieurs PDF ou une archive ZIP passent par le tri du dossier (barelvox.package).
+    """
+    def run(job):
+        documents = expand_uploads(files)
+        if not documents:
+            raise ValueError("Aucun PDF dans les fichiers déposés")
+        stages = COUNCIL_STAGES if len(documents) == 1 else PACKAGE_STAGES
+
+        def on_start(index, stage):
+            job.update(max(index * 100 // len(stages), 5), stage.label)
+
+        def on_end(index, stage, elapsed, ctx):
+            job.log(stage_log_html(stage, elapsed, ctx))
+            job.update(progress_after(index, stages), f"{stage.name} : Terminé")
+
+        options = dict(
+            use_cache=use_cache,
+            pacing=pacing,
+            on_stage_start=on_start,
+            on_stage_end=on_end,
+            on_avenor_token=job.stream,
+            session_id=session_id,
+            cancel_event=job.cancel_event,
+            build_index=True,
+        )
+        if len(documents) == 1:
+            ctx = run_council(documents[0][1], name=name, **options)
+        else:
+            ctx = run_package(documents, **options)
+        return {"avenor_res": ctx["avenor_res"], "dce_index": ctx["dce_index"], "revision": ctx["revision"], "trace": ctx["trace"].summary()}
+    return run
+
+def revision_summary(revision):
+    """Message Evena : ce qui a changé depuis la version précédente du DCE."""
+    def page_list(pages):
+        return ", ".join(str(p) for p in pages[:20]) + (" ..." if len(pages) > 20 else "")
+
+    previous = revision["previous"]["name"] or revision["previous"]["sha256"][:12]
+    lines = [f"Nouvelle version de **{previous}** : {revision['unchanged']} page(s) inchangée(s)."]
+    if revision["changed"]: lines.append(f"- Pages modifiées : {page_list(revision['changed'])}")
+    if revision["added"]: lines.append(f"- Pages ajoutées : {page_list(revision['added'])}")
+    if revision["removed"]: lines.append(f"- Pages supprimées (ancienne numérotation) : {page_list(revision['removed'])}")
+    if not (revision["changed"] or revision["added"] or revision["removed"]):
+        lines.append("- Texte identique (seule la mise en forme du PDF diffère).")
+    if revision["flag_changes"]:
+        for key, (before, after) in revision["flag_changes"].items():
+            lines.append(f"- Flag {key.capitalize()} : {before} → {after}")
     else:
-        final_content = f"{role_prompt}\n\n---\n\nCONTEXTE :\n{data_part}"
+        lines.append("- Aucun flag modifié.")
+    return "\n".join(lines)
+
+def forget_job():
+    st.session_state.job_id = None
+    st.query_params.pop("job", None)
+
+def pickup_job(job):
+    """Résultat d'une tâche terminée -> état de la session (une seule fois), puis tâche oubliée."""
+    forget_job()
+    if job is not None:
+        jobs.forget(job.id)
+    if job is None:
+        st.session_state.job_error = "Analyse introuvable (expirée ou serveur redémarré). Déposez à nouveau le DCE."
+    elif job.status == "done":
+        avenor_res = job.result["avenor_res"]
+        st.session_state.last_trace = job.result["trace"]
+
+        # FIN : durée vécue par l'utilisateur, file d'attente comprise
+        duration = job.finished - job.created
+        time_str = f"{int(duration // 60)} min {int(duration % 60)} s"
+
+        st.session_state.verdict_color = {"🔴": "red", "🟠": "orange", "🟢": "green"}[verdict_flag(avenor_res)]
+
+        # Chat : verdict + index du DCE (les passages utiles sont retrouvés à chaque question)
+        st.session_state.full_context = avenor_res
+        st.session_state.dce_index = job.result["dce_index"]
+
+        if job.result["revision"]:
+            st.session_state.messages.append({"role": "assistant", "name": "Evena", "avatar": "evena", "content": revision_summary(job.result["revision"])})
+        st.session_state.analysis_complete = True
 
-    max_retries = 2
-    attempts = 0
-    
-    while attempts < max_retries:
-        try:
-            response = model.generate_content(final_content)
-            text_resp = response.text
-            
-            if output_json:
-                data = clean_gemini_json(text_resp)
-                # Vérification que c'est bien un dict et qu'il n'est pas vide
-                if data and isinstance(data, dict): 
-                    return data
-                else: 
-                    raise ValueError("JSON invalide ou vide")
-            else:
-                return text_resp
-            
-        except Exception as e:
-            attempts += 1
-            time.sleep(1)
-            
-            if attempts == max_retries:
-                # SAFE RETURN
-                if output_json:
-                    return {
-                        "liorah": {"analyse": "Analyse partielle (Structure)", "flag": "🟠"},
-                        "ethan": {"analyse": "Données complexes", "flag": "🟠"},
-                        "krypt": {"analyse": "Données extraites", "flag": "🟢"}
-                    }
-                return f"⚠️ **Note Avenor :** Analyse complexe. Détail technique : {str(e)}"
-    
-    return "Erreur Système"
-
-def phoebe_processing(trinity_report):
-    # Sécurisation si trinity_report n'est pas un dict
-    if not isinstance(trinity_report, dict):
-        return "RAPPORT SYNTHÈSE\nErreur de structure des données."
-    return f"RAPPORT SYNTHÈSE\nDonnées Techniques : {json.dumps(trinity_report, ensure_ascii=False)}"
-
-# --- PROMPTS ---
-P_TRINITE = """
-Tu es la Trinité (Liorah, Ethan, Krypt). Analyse le CCTP.
-**OBJECTIF :** Détecter les marques imposées SANS mention "ou équivalent".
-
-**RÈGLES :**
-1. Si Marque citée SANS "ou équivalent" (même paragraphe) -> 🟠 (Alerte).
-2. Si Marque citée AVEC "ou équivalent" -> 🟢 (RAS).
-
-**OUTPUT JSON UNIQUE (PAS DE LISTE) :**
-{
-  "liorah": {"analyse": "[Page X] Marque Y imposée sans équivalence.", "flag": "🟠"},
-  "ethan": {"analyse": "RAS - Normes DTU respectées.", "flag": "🟢"},
-  "krypt": {"analyse": "RAS", "flag": "🟢"}
-}
-"""
-
-P_AVENOR = """Tu es AVENOR, Directeur BTP. Rédige le verdict.
-
-**LOGIQUE :**
-- Si JSON contient 🟠 ou 🔴 -> Verdict [FLAG : 🟠].
-- Sinon -> [FLAG : 🟢].
-
-**FORMAT MARKDOWN :**
-[FLAG : X]
-
-### 🛡️ VERDICT DU CONSEIL
-**Décision :** [Phrase Expert BTP]
-
-**⚠️ VIGILANCE EXPERTE :**
-* [Reprends les localisations Page/Art précises]
+        st.session_state.messages.append({
+            "role": "assistant", "name": "Avenor", "avatar": "avenor",
+            "content": avenor_res,
+            "timestamp": time_str
+        })
+    elif job.status == "cancelled":
+        st.session_state.messages.append({"role": "assistant", "name": "Avenor", "avatar": "avenor", "content": "Analyse annulée. Déposez un DCE pour relancer le protocole."})
+    else:
+        st.session_state.job_error = job.error
 
-**💡 CONSEIL STRATÉGIQUE :**
-* [Conseil Actionnable : Variantes, Fiches Techniques, Validation Bureau Contrôle]
-"""
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def job_progress(job_id):
+    """Suivi en direct d'une analyse ; rerun complet dès qu'elle est finie pour récupérer le résultat."""
+    job = jobs.get(job_id)
+    if job is None or job.done:
+        st.rerun()
+    for line in list(job.logs):
+        st.markdown(f'<div class="success-log">{line}</div>', unsafe_allow_html=True)
+    if job.status == "queued":
+        st.progress(0, text=f"En file d'attente ({jobs.position(job)} analyse(s) devant)...")
+    elif job.cancel_event.is_set():
+        st.progress(job.progress, text="Annulation en cours...")
+    else:
+        st.progress(job.progress, text=job.stage or "Initialisation...")
+    if job.partial:
+        st.markdown(without_flags(job.partial) + " ▌", unsafe_allow_html=True)
+    if st.button("⏹️ Annuler l'analyse", disabled=job.cancel_event.is_set()):
+        job.cancel()
+        st.rerun()
 
-P_CHAT_AVENOR = "Tu es AVENOR. Expert BTP, direct et précis."
+active_job = jobs.get(st.session_state.job_id)
+if st.session_state.job_id and (active_job is None or active_job.done):
+    pickup_job(active_job)
+    active_job = None
 
 # --- SIDEBAR ---
 with st.sidebar:
@@ -320,11 +351,21 @@ with st.sidebar:
         st.markdown("## 🏗️ BAREL VOX")
         
     st.markdown("---")
-    api_key = st.text_input("🔑 Clé API Google Gemini", type="password")
-    
-    if api_key:
-        genai.configure(api_key=api_key)
-        st.success(f"Moteur Connecté (Gemini-3.0-Pro) 🟢")
+    backend = get_backend()
+    if backend.requires_api_key:
+        api_key = st.text_input("🔑 Clé API Google Gemini", type="password")
+        
+        if api_key:
+            # Client réutilisé : reconfiguré seulement si la clé change
+            backend.configure(api_key)
+            st.success(f"Moteur Connecté (Gemini-3.0-Pro) 🟢")
+    else:
+        api_key = "local"
+        st.success(f"Moteur local ({backend.name}) 🟢")
+
+    # Rythme de présentation : opt-in explicite, jamais par défaut
+    demo_pacing = st.toggle("🎬 Mode démo (rythme présentation)", value=os.environ.get("BAREL_DEMO_PACING") == "1")
+    llm_cache_bypass = st.toggle("♻️ Ignorer le cache modèle", value=False, disabled=not LLM_CACHE_ENABLED)
 
     st.markdown("---")
     st.markdown("### 🧬 ÉTAT DU CONSEIL")
@@ -333,6 +374,28 @@ with st.sidebar:
     st.markdown("**Trinité** (Experts) : 🟢 Prêts")
     st.markdown("**Phoebe** (Synthèse) : 🟢 Prête")
     st.markdown("**Avenor** (Arbitre) : 🟢 En attente")
+    cache_stats = extract_cache.stats()
+    st.caption(f"Cache lecture DCE : {cache_stats['hits']} hit(s) / {cache_stats['misses']} miss")
+    llm_stats = llm_cache.stats()
+    st.caption(f"Cache modèle : {llm_stats['hits']} hit(s) / {llm_stats['misses']} miss")
+
+    # Panneau debug : où part le temps (pypdf, modèle, file d'attente)
+    if st.toggle("🔬 Debug (métriques)", value=os.environ.get("BAREL_DEBUG_PANEL") == "1"):
+        trace = st.session_state.last_trace
+        if trace:
+            st.markdown(f"**Dernière analyse** `{trace['run_id']}` ({trace['outcome']})")
+            st.dataframe(
+                [{"étape": key, **values} for key, values in trace["stages"].items()],
+                hide_index=True,
+            )
+            with st.expander(f"Appels modèle ({len(trace['calls'])})"):
+                st.dataframe(trace["calls"], hide_index=True)
+            st.download_button("⬇️ Trace JSON", json.dumps(trace, ensure_ascii=False, indent=2), file_name=f"trace_{trace['run_id']}.json", mime="application/json")
+        else:
+            st.caption("Aucune analyse dans cette session.")
+        sched = scheduler.stats()
+        st.caption(f"File modèle : {sched['inflight']} en cours, {sched['waiting']} en attente, {sched['retries']} reprise(s), attente cumulée {sched['queue_wait']:.1f}s")
+        st.download_button("⬇️ Métriques Prometheus", registry.render(), file_name="barelvox.prom", mime="text/plain")
     
     st.markdown("---")
     if st.button("🔄 Reset Session"):
@@ -343,6 +406,14 @@ with st.sidebar:
         })
         st.session_state.analysis_complete = False
         st.session_state.verdict_color = "neutral"
+        st.session_state.dce_index = None
+        st.session_state.job_error = None
+        # Le fichier encore présent dans l'uploader est resoumis après le reset
+        st.session_state.submitted_file = None
+        running = jobs.get(st.session_state.job_id)
+        if running is not None:
+            running.cancel()
+        forget_job()
         st.rerun()
 
 # --- CHAT & LOGIC ---
@@ -377,93 +448,27 @@ for msg in st.session_state.messages:
 
 # --- PROCESS FLOW ---
 if not st.session_state.analysis_complete:
-    uploaded_file = st.file_uploader("Upload DCE", type=['pdf'], label_visibility="collapsed")
-    if uploaded_file and api_key:
-        if not st.session_state.messages or st.session_state.messages[-1]["role"] != "user":
-             st.session_state.messages.append({"role": "user", "name": "User", "avatar": "user", "content": f"Dossier : {uploaded_file.name}"})
-             st.rerun()
-
-    if st.session_state.messages and st.session_state.messages[-1]["role"] == "user" and not st.session_state.analysis_complete:
-        
-        log_container = st.container()
-        progress_bar = st.progress(0, text="Initialisation...")
-        status_placeholder = st.empty()
-        start_time = time.time()
-        
-        try:
-            uploaded_file.seek(0)
-            pdf_bytes = uploaded_file.getvalue()
-
-            # 1. EVENA
-            progress_bar.progress(10, text="Evena : Lecture...")
-            time.sleep(11)
-            log_container.markdown(f'<div class="success-log">✅ Evena : Lecture Terminée (11s)</div>', unsafe_allow_html=True)
-
-            # 2. KERES
-            progress_bar.progress(30, text="Kérès : Sécurisation...")
-            time.sleep(13)
-            log_container.markdown('<div class="success-log">✅ Kérès : Données sécurisées (13s)</div>', unsafe_allow_html=True)
-
-            # 3. TRINITE
-            delay = random.randint(30, 35)
-            progress_bar.progress(60, text=f"Trinité : Analyse ({delay}s)...")
-            
-            t1 = time.time()
-            trinity_res = call_gemini_resilient(P_TRINITE, pdf_bytes, True, "Trinité", output_json=True, status_placeholder=status_placeholder)
-            t2 = time.time()
-            
-            used = t2 - t1
-            if used < delay: time.sleep(delay - used)
-            
-            status_placeholder.empty()
-            
-            # Logs Trinité (Safe Access)
-            # Utilisation de .get() sur un dict garanti par clean_gemini_json
-            if isinstance(trinity_res, dict):
-                l_flag = trinity_res.get('liorah', {}).get('flag', '🟢')
-                e_flag = trinity_res.get('ethan', {}).get('flag', '🟢')
-                k_flag = trinity_res.get('krypt', {}).get('flag', '🟢')
-            else:
-                l_flag, e_flag, k_flag = "🟢", "🟢", "🟢"
-            
-            log_container.markdown(f'''<div class="success-log">✅ Trinité : Rapports Validés ({int(delay)}s)<br>- Juridique : {l_flag} | Risques : {e_flag} | Data : {k_flag}</div>''', unsafe_allow_html=True)
-
-            # 4. PHOEBE
-            progress_bar.progress(80, text="Phoebe : Synthèse...")
-            time.sleep(8)
-            phoebe_res = phoebe_processing(trinity_res)
-            log_container.markdown('<div class="success-log">✅ Phoebe : Synthèse prête (8s)</div>', unsafe_allow_html=True)
-
-            # 5. AVENOR
-            progress_bar.progress(90, text="Avenor : Verdict...")
-            avenor_res = call_gemini_resilient(P_AVENOR, phoebe_res, False, "Avenor", False, status_placeholder)
-            status_placeholder.empty()
-
-            # FIN
-            end_time = time.time()
-            duration = end_time - start_time
-            time_str = f"{int(duration // 60)} min {int(duration % 60)} s"
-            
-            progress_bar.progress(100, text="Terminé")
-            time.sleep(1)
-            progress_bar.empty()
-            
-            if "[FLAG : 🔴]" in avenor_res: st.session_state.verdict_color = "red"
-            elif "[FLAG : 🟠]" in avenor_res: st.session_state.verdict_color = "orange"
-            else: st.session_state.verdict_color = "green"
-            
-            st.session_state.full_context = phoebe_res + "\n" + avenor_res
-            st.session_state.analysis_complete = True
-            
-            st.session_state.messages.append({
-                "role": "assistant", "name": "Avenor", "avatar": "avenor",
-                "content": avenor_res,
-                "timestamp": time_str
-            })
+    if active_job is None:
+        uploaded_files = st.file_uploader("Upload DCE", type=['pdf', 'zip'], accept_multiple_files=True, label_visibility="collapsed")
+        if st.session_state.job_error:
+            st.error(f"Erreur Fatale : {st.session_state.job_error}")
+        # Un même dépôt n'est soumis qu'une fois (pas de relance automatique après une erreur)
+        upload_id = tuple(f.file_id for f in uploaded_files) if uploaded_files else None
+        if upload_id and api_key and upload_id != st.session_state.submitted_file:
+            st.session_state.submitted_file = upload_id
+            st.session_state.job_error = None
+            name = ", ".join(f.name for f in uploaded_files)
+            st.session_state.messages.append({"role": "user", "name": "User", "avatar": "user", "content": f"Dossier : {name}"})
+            job = jobs.submit(
+                council_job([(f.name, f.getvalue()) for f in uploaded_files], name, not llm_cache_bypass, demo_pacing, session_id),
+                label=name,
+                owner=session_id,
+            )
+            st.session_state.job_id = job.id
+            st.query_params["job"] = job.id
             st.rerun()
-
-        except Exception as e:
-            st.error(f"Erreur Fatale : {str(e)}")
+    else:
+        job_progress(active_job.id)
 
 # --- CHAT INPUT ---
 if st.session_state.analysis_complete:
@@ -472,15 +477,21 @@ if st.session_state.analysis_complete:
         st.session_state.messages.append({"role": "user", "name": "User", "avatar": "user", "content": q})
         with st.chat_message("user", avatar=get_avatar_safe("user")): st.write(q)
             
-        with st.spinner("Avenor consulte le dossier..."):
-            chat_context = f"CONTEXTE DOSSIER:\n{st.session_state.full_context}"
+        # Réponse streamée dans la bulle ; le message stocké reste la réponse finale
+        with st.chat_message("assistant", avatar=get_avatar_safe("avenor")):
+            st.markdown("**Avenor**")
+            reply_placeholder = st.empty()
+            reply_placeholder.markdown("_Avenor consulte le dossier..._")
             reply = call_gemini_resilient(
                 P_CHAT_AVENOR,
-                f"{chat_context}\n\nQUESTION UTILISATEUR:\n{q}",
+                chat_payload(q, st.session_state.full_context, st.session_state.dce_index),
                 False, 
                 "Avenor Chat",
                 output_json=False,
-                status_placeholder=st.empty()
+                status_placeholder=reply_placeholder,
+                use_cache=not llm_cache_bypass,
+                on_token=stream_preview(reply_placeholder),
+                session_id=session_id
             )
             
         st.session_state.messages.append({"role": "assistant", "name": "Avenor", "avatar": "avenor", "content": reply})
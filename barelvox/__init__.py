@@ -0,0 +1 @@
+"""BAREL VOX - Moteur du Council OEE (hors interface Streamlit)."""
@@ -0,0 +1,86 @@
+"""Manifeste des assets (avatars, logo) : scan unique, data URIs en cache process.
+
+Les noms de fichiers sont résolus sans tenir compte de la casse ni des espaces
+parasites (`Krypt.png`, `evena .png`). Une entrée est ré-encodée seulement si
+son mtime change ; le dossier n'est re-scanné que si son propre mtime change.
+"""
+import base64
+import functools
+import os
+import threading
+
+ASSETS_DIR = "assets"
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".ico")
+MIME_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".ico": "image/x-icon"}
+
+
+@functools.lru_cache(maxsize=64)
+def placeholder_data_uri(key):
+    """Avatar généré localement (initiales sur disque sombre), sans service externe."""
+    initials = "".join(w[0] for w in key.replace("-", " ").split()[:2]).upper() or "?"
+    svg = (
+        '<svg xmlns="http://www.w3.org/2000/svg" width="128" height="128" viewBox="0 0 128 128">'
+        '<rect width="128" height="128" fill="#333"/>'
+        '<text x="50%" y="50%" dy=".35em" text-anchor="middle" fill="#fff" '
+        f'font-family="Helvetica, Arial, sans-serif" font-size="56">{initials}</text></svg>'
+    )
+    return "data:image/svg+xml;base64," + base64.b64encode(svg.encode("utf-8")).decode()
+
+
+class AssetManifest:
+    def __init__(self, directory=ASSETS_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._dir_mtime = None
+        self._paths = {}
+        self._uris = {}
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.directory).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._dir_mtime:
+            return
+        paths = {}
+        if mtime is not None:
+            # Ordre de préférence : extension, puis nom exact avant nom à espaces parasites
+            ranked = []
+            for name in os.listdir(self.directory):
+                stem, ext = os.path.splitext(name)
+                ext = ext.lower()
+                if ext not in IMAGE_EXTS:
+                    continue
+                ranked.append((IMAGE_EXTS.index(ext), stem != stem.strip(), name, stem.strip().lower()))
+            for _, _, name, key in sorted(ranked):
+                paths.setdefault(key, os.path.join(self.directory, name))
+        self._paths = paths
+        self._dir_mtime = mtime
+
+    def path(self, key):
+        """Chemin de l'asset pour `key` (insensible à la casse), ou None."""
+        with self._lock:
+            self._refresh()
+            return self._paths.get(key.strip().lower())
+
+    def data_uri(self, key):
+        """Data URI de l'asset, encodée une fois par version du fichier ; placeholder sinon."""
+        path = self.path(key)
+        if path:
+            try:
+                mtime = os.stat(path).st_mtime
+                cached = self._uris.get(path)
+                if cached and cached[0] == mtime:
+                    return cached[1]
+                with open(path, "rb") as f:
+                    data = f.read()
+                mime = MIME_TYPES[os.path.splitext(path)[1].lower()]
+                uri = f"data:{mime};base64,{base64.b64encode(data).decode()}"
+                self._uris[path] = (mtime, uri)
+                return uri
+            except OSError:
+                pass
+        return placeholder_data_uri(key)
+
+
+manifest = AssetManifest()
@@ -0,0 +1,185 @@
+"""Backends modèle : Gemini en production, stand-in local pour les tests de charge.
+
+Un backend expose `name`, `requires_api_key`, `configure(api_key)`,
+`generate(model_name, prompt, generation_config) -> str` et `stream(...)`,
+qui produit la même réponse fragment par fragment.
+
+Sélection : BAREL_BACKEND=gemini|stub. Le stub se règle par variables
+d'environnement (latence, gigue, taux d'erreur, sorties figées) :
+BAREL_STUB_LATENCY, BAREL_STUB_JITTER, BAREL_STUB_ERROR_RATE,
+BAREL_STUB_TRINITE (fichier JSON), BAREL_STUB_AVENOR (fichier texte), BAREL_STUB_SEED.
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from barelvox.prescan import default_matcher, normalize, EQUIVALENT_RE
+
+
+class GeminiBackend:
+    """Client Gemini : un GenerativeModel réutilisé par (modèle, configuration)."""
+
+    name = "gemini"
+    requires_api_key = True
+
+    def __init__(self):
+        self._api_key = None
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def configure(self, api_key):
+        """genai.configure uniquement si la clé change (les modèles sont alors recréés)."""
+        with self._lock:
+            if api_key == self._api_key:
+                return
+            import google.generativeai as genai
+            genai.configure(api_key=api_key)
+            self._api_key = api_key
+            self._models.clear()
+
+    def _model(self, model_name, generation_config):
+        key = (model_name, json.dumps(generation_config or {}, sort_keys=True))
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                import google.generativeai as genai
+                model = genai.GenerativeModel(model_name, generation_config=generation_config)
+                self._models[key] = model
+            return model
+
+    def generate(self, model_name, prompt, generation_config):
+        return self._model(model_name, generation_config).generate_content(prompt).text
+
+    def stream(self, model_name, prompt, generation_config):
+        for chunk in self._model(model_name, generation_config).generate_content(prompt, stream=True):
+            yield chunk.text
+
+
+class StubRateLimitError(RuntimeError):
+    """429 simulé (classé "rate_limit" par l'ordonnanceur)."""
+
+
+class StubBackend:
+    """Stand-in local, sans réseau, calqué sur les prompts du Council.
+
+    Trinité : une marque du référentiel sans "ou équivalent" dans un paragraphe -> 🟠
+    (ou le rapport figé `trinite_output`). Avenor : reprend le pire flag du contexte
+    (ou le texte figé `avenor_output`). `latency` + gigue uniforme `jitter` par appel ;
+    `error_rate` : part des appels qui échouent (moitié 429, moitié timeout).
+    """
+
+    name = "stub"
+    requires_api_key = False
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, trinite_output=None, avenor_output=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.trinite_output = trinite_output
+        self.avenor_output = avenor_output
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        def read(var):
+            path = os.environ.get(var)
+            if not path:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        trinite = read("BAREL_STUB_TRINITE")
+        seed = os.environ.get("BAREL_STUB_SEED")
+        return cls(
+            latency=float(os.environ.get("BAREL_STUB_LATENCY", "0")),
+            jitter=float(os.environ.get("BAREL_STUB_JITTER", "0")),
+            error_rate=float(os.environ.get("BAREL_STUB_ERROR_RATE", "0")),
+            trinite_output=json.loads(trinite) if trinite else None,
+            avenor_output=read("BAREL_STUB_AVENOR"),
+            seed=int(seed) if seed else None,
+        )
+
+    def configure(self, api_key):
+        pass
+
+    def _simulate_call(self):
+        with self._lock:
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            roll = self._rng.random()
+        if delay:
+            time.sleep(delay)
+        if roll < self.error_rate / 2:
+            raise StubRateLimitError("429 Resource has been exhausted (stub)")
+        if roll < self.error_rate:
+            raise TimeoutError("Deadline exceeded (stub)")
+
+    def generate(self, model_name, prompt, generation_config):
+        self._simulate_call()
+        return self._answer(prompt, generation_config)
+
+    def stream(self, model_name, prompt, generation_config):
+        self._simulate_call()
+        for piece in re.split(r"(?<=\s)", self._answer(prompt, generation_config)):
+            yield piece
+
+    def _answer(self, prompt, generation_config):
+        if (generation_config or {}).get("response_mime_type") == "application/json":
+            return json.dumps(self.trinite_output or self.trinity_report(prompt), ensure_ascii=False)
+        if "VERDICT" in prompt.split("---", 1)[0]:
+            if self.avenor_output:
+                return self.avenor_output
+            context = prompt.split("CONTEXTE :", 1)[-1]
+            flag = "🟠" if ("🟠" in context or "🔴" in context) else "🟢"
+            return (
+                f"[FLAG : {flag}]\n\n### 🛡️ VERDICT DU CONSEIL\n**Décision :** Verdict stub.\n\n"
+                "**⚠️ VIGILANCE EXPERTE :**\n* Voir rapport Trinité.\n\n"
+                "**💡 CONSEIL STRATÉGIQUE :**\n* Réponse générée hors ligne (backend stub)."
+            )
+        return "Réponse stub d'Avenor (backend hors ligne)."
+
+    def trinity_report(self, prompt):
+        content = prompt.split("CONTENU DU DCE (EXTRAIT):", 1)[-1]
+        matcher = default_matcher()
+        findings, pages = [], []
+        for page, text in re.findall(r"\[Page (\d+)\]\n(.*?)(?=\n\[Page \d+\]\n|\Z)", content, re.DOTALL):
+            for paragraph in text.split("\n\n"):
+                norm = normalize(paragraph)
+                brands = matcher.find(norm)
+                if brands and not EQUIVALENT_RE.search(norm):
+                    findings.append(f"[Page {page}] Marque {', '.join(brands)} imposée sans équivalence.")
+                    if int(page) not in pages:
+                        pages.append(int(page))
+        liorah = {"analyse": "\n".join(findings), "flag": "🟠", "pages": pages} if findings else {"analyse": "RAS", "flag": "🟢", "pages": []}
+        return {
+            "liorah": liorah,
+            "ethan": {"analyse": "RAS - Normes DTU respectées.", "flag": "🟢", "pages": []},
+            "krypt": {"analyse": "RAS", "flag": "🟢", "pages": []},
+        }
+
+
+BACKENDS = {"gemini": GeminiBackend, "stub": StubBackend.from_env}
+
+
+
+def _make_backend(name):
+    """Instancie le backend `name` ; un nom inconnu est une erreur, pas un repli silencieux sur Gemini."""
+    if name not in BACKENDS:
+        raise ValueError(f"Backend inconnu : {name!r} (attendu : {', '.join(sorted(BACKENDS))})")
+    return BACKENDS[name]()
+
+
+_backend = _make_backend(os.environ.get("BAREL_BACKEND", "gemini"))
+
+
+def get_backend():
+    return _backend
+
+
+def set_backend(backend):
+    """Remplace le backend du process (nom de BACKENDS ou instance)."""
+    global _backend
+    _backend = _make_backend(backend) if isinstance(backend, str) else backend
+    return _backend
@@ -0,0 +1,163 @@
+"""CLI batch : le Council sur des dossiers entiers de DCE, sans navigateur.
+
+    python -m barelvox archives/2024/ "tenders/**/*.pdf" -o resultats.jsonl -j 4
+
+Une archive ZIP est un dossier multi-pièces (barelvox.package : tri RC / CCAP /
+CCTP par lot / plans..., un seul verdict). Une ligne JSON par dossier (flags, verdict, timings, métriques par étape,
+révision par rapport à une version déjà analysée du même DCE).
+Relancer la même commande reprend là où elle s'était arrêtée : les PDF déjà
+traités avec succès (même SHA-256) sont ignorés.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from barelvox.backends import BACKENDS, set_backend
+from barelvox.engine import run_council, trinity_flags, verdict_flag
+from barelvox.extraction import pdf_sha256
+from barelvox.package import expand_uploads, run_package
+
+
+def collect_inputs(patterns):
+    """PDF et archives ZIP désignés par des dossiers (récursif) ou des globs, dédoublonnés et triés."""
+    paths = set()
+    for pattern in patterns:
+        # Dossier : tous les fichiers, filtrés sur l'extension sans casse (.PDF, .Zip...)
+        expression = os.path.join(pattern, "**", "*") if os.path.isdir(pattern) else pattern
+        for path in glob.glob(expression, recursive=True):
+            if os.path.isfile(path) and path.lower().endswith((".pdf", ".zip")):
+                paths.add(os.path.abspath(path))
+    return sorted(paths)
+
+
+def load_done(output):
+    """SHA-256 des dossiers déjà analysés avec succès dans le JSONL de sortie."""
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Dernière ligne tronquée par une interruption
+                continue
+            if record.get("status") == "ok":
+                done.add(record.get("sha256"))
+    return done
+
+
+def analyse_file(path, use_cache=True, pdf_bytes=None):
+    """Analyse un PDF (ou une archive ZIP) et renvoie son enregistrement JSONL (erreurs comprises)."""
+    t0 = time.perf_counter()
+    record = {"file": path}
+    try:
+        if pdf_bytes is None:
+            with open(path, "rb") as f:
+                pdf_bytes = f.read()
+        record["sha256"] = pdf_sha256(pdf_bytes)
+        # Un dossier = une "session" pour l'équité de l'ordonnanceur
+        # Comme l'app : un seul PDF (ZIP compris) suit le Council historique, avec son historique de versions
+        documents = expand_uploads([(path, pdf_bytes)]) if path.lower().endswith(".zip") else [(path, pdf_bytes)]
+        if not documents:
+            raise ValueError("Aucun PDF dans l'archive")
+        if len(documents) == 1:
+            ctx = run_council(documents[0][1], use_cache=use_cache, session_id=path, name=path)
+        else:
+            ctx = run_package(documents, use_cache=use_cache, session_id=path)
+        record.update({
+            "status": "ok",
+            "pages": ctx["dce_stats"]["pages"],
+            "flags": trinity_flags(ctx["trinity_res"]),
+            "verdict_flag": verdict_flag(ctx["avenor_res"]),
+            "verdict": ctx["avenor_res"],
+            "trinity": ctx["trinity_res"],
+            "timings": {k: round(v, 3) for k, v in ctx["timings"].items()},
+            "metrics": ctx["trace"].summary()["stages"],
+            "revision": ctx["revision"],
+        })
+        if "documents" in ctx:
+            record["documents"] = [
+                {"name": sub["document"].name, "kind": sub["document"].kind, "lot": sub["document"].lot, "flags": trinity_flags(sub["trinity_res"])}
+                for sub in ctx["documents"]
+            ]
+            record["skipped"] = [{"name": doc.name, "kind": doc.kind} for doc in ctx["skipped"]]
+            record["unreadable"] = [{"name": item.document.name, "kind": item.document.kind, "reason": item.reason} for item in ctx["unreadable"]]
+    except Exception as e:
+        record.update({"status": "error", "error": str(e)})
+    record["duration"] = round(time.perf_counter() - t0, 3)
+    return record
+
+
+def run_batch(paths, output, jobs=2, use_cache=True, log=None):
+    """Traite `paths` avec au plus `jobs` dossiers en parallèle ; renvoie (ok, erreurs, ignorés)."""
+    done = load_done(output)
+    lock = threading.Lock()
+    counts = {"ok": 0, "error": 0, "skipped": 0}
+
+    def worker(path):
+        try:
+            with open(path, "rb") as f:
+                pdf_bytes = f.read()
+        except OSError as e:
+            # Fichier disparu ou illisible : une ligne d'erreur, le batch continue
+            record = {"file": path, "status": "error", "error": str(e), "duration": 0.0}
+        else:
+            if pdf_sha256(pdf_bytes) in done:
+                with lock:
+                    counts["skipped"] += 1
+                return
+            record = analyse_file(path, use_cache, pdf_bytes)
+        with lock:
+            # Écriture + flush par dossier : une interruption ne perd que les dossiers en cours
+            with open(output, "a", encoding="utf-8") as out:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            counts[record["status"]] += 1
+            if log:
+                log(f"[{record['status']}] {path} ({record['duration']}s)")
+
+    pool = ThreadPoolExecutor(max_workers=max(1, jobs))
+    try:
+        for future in [pool.submit(worker, p) for p in paths]:
+            future.result()
+    except KeyboardInterrupt:
+        # Ctrl-C : les dossiers en attente sont abandonnés, ceux en cours finissent et sont écrits
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+    return counts["ok"], counts["error"], counts["skipped"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="barelvox", description="Council OEE en batch sur des DCE (PDF).")
+    parser.add_argument("inputs", nargs="+", help="Dossiers ou globs de PDF / ZIP")
+    parser.add_argument("-o", "--output", default="barelvox_results.jsonl", help="Fichier JSONL de sortie (reprise incluse)")
+    parser.add_argument("-j", "--jobs", type=int, default=2, help="Dossiers analysés en parallèle")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=os.environ.get("BAREL_BACKEND", "gemini"), help="Backend modèle (stub : réglages BAREL_STUB_*)")
+    parser.add_argument("--api-key", default=os.environ.get("GOOGLE_API_KEY", ""), help="Clé Gemini (défaut : GOOGLE_API_KEY)")
+    parser.add_argument("--no-cache", action="store_true", help="Ignorer le cache des réponses modèle")
+    args = parser.parse_args(argv)
+
+    backend = set_backend(args.backend)
+    if backend.requires_api_key:
+        if not args.api_key:
+            parser.error("clé API requise (--api-key ou GOOGLE_API_KEY), ou --backend stub")
+        backend.configure(args.api_key)
+
+    paths = collect_inputs(args.inputs)
+    if not paths:
+        parser.error("aucun PDF ni ZIP trouvé")
+    log = lambda msg: print(msg, file=sys.stderr, flush=True)
+    log(f"{len(paths)} dossier(s) -> {args.output}")
+    try:
+        ok, errors, skipped = run_batch(paths, args.output, args.jobs, not args.no_cache, log)
+    except KeyboardInterrupt:
+        log("Interrompu : relancer la même commande pour reprendre")
+        return 130
+    log(f"Terminé : {ok} ok, {errors} erreur(s), {skipped} déjà traité(s)")
+    return 1 if errors else 0
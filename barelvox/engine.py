@@ -0,0 +1,352 @@
+"""Moteur du Council OEE : appels modèle, prompts et étapes Evena → Avenor.
+
+Aucune dépendance à Streamlit : utilisable par l'app, la CLI batch et les tests.
+"""
+import json
+import time
+
+from barelvox.backends import get_backend
+from barelvox.extraction import PageSource, extract_text_from_bytes, pages_to_text
+from barelvox.jsonrepair import parse_json
+from barelvox.llm_cache import LLM_CACHE_ENABLED, content_hash, llm_cache, make_key
+from barelvox.metrics import RunTrace, record_call, record_extraction, registry
+from barelvox.pipeline import Cancelled, Stage, check_cancelled, run_pipeline
+from barelvox.prescan import PRESCAN_ENABLED, prescan
+from barelvox.retrieval import DceIndex
+from barelvox.scheduler import RETRY_POLICY, BadJSONError, backoff_delay, classify_error, scheduler
+from barelvox.trinite import TRINITE_SCHEMA, estimate_tokens, iter_chunks, renumber_report, run_mapreduce, validate_report
+from barelvox.versions import VERSIONS_ENABLED, compare_versions, page_hash, version_store
+
+# --- CONFIGURATION MOTEUR ---
+MODEL_NAME = "gemini-2.0-flash"
+
+def clean_gemini_json(text):
+    """Extraction Blindée Anti-Crash (Liste vs Dict) : dict réparé en une passe, ou None."""
+    data, _ = parse_json(text)
+    return data if isinstance(data, dict) else None
+
+def call_gemini_resilient(role_prompt, data_part, is_pdf, agent_name, output_json=False, status_placeholder=None, use_cache=True, on_token=None, session_id=None, trace=None, response_schema=None, validate=None):
+    """Appel modèle avec cache, quotas partagés et reprises adaptatives.
+
+    `on_token(texte_cumulé)` active le streaming (réponses texte uniquement) :
+    il est rappelé à chaque fragment reçu, et repart de zéro si une tentative échoue.
+    `session_id` sert à l'équité de la file d'attente entre sessions.
+    `trace` (metrics.RunTrace) reçoit la mesure de l'appel ; sans trace, seuls
+    les compteurs du process sont mis à jour.
+    JSON : `response_schema` contraint la sortie du modèle, la réponse est réparée
+    localement (parse_json) puis passée à `validate(data) -> dict | None`.
+    """
+    t0 = time.perf_counter()
+    generation_config = {"response_mime_type": "application/json"} if output_json else {}
+    if output_json and response_schema:
+        generation_config["response_schema"] = response_schema
+
+    final_content = ""
+    if is_pdf:
+        header = f"{role_prompt}\n\n---\n\nCONTENU DU DCE (EXTRAIT):\n"
+        if isinstance(data_part, bytes):
+            final_content = header + extract_text_from_bytes(data_part)
+        elif isinstance(data_part, str):
+            final_content = header + data_part
+        else:
+            # Flux de pages d'Evena : on ne construit que le payload envoyé
+            final_content = header + pages_to_text(data_part)
+    else:
+        final_content = f"{role_prompt}\n\n---\n\nCONTEXTE :\n{data_part}"
+
+    # Cache partagé : le bypass force un nouvel appel mais rafraîchit l'entrée
+    cache_kind = "json" if output_json else "text"
+    backend = get_backend()
+    # Le backend fait partie de la clé : une réponse stub ne sert jamais pour Gemini
+    cache_key = make_key(f"{backend.name}:{MODEL_NAME}", generation_config, role_prompt, content_hash(final_content)) if LLM_CACHE_ENABLED else None
+    attempts = {}
+    queue_wait = 0.0
+
+    def measure(outcome, response):
+        size = len(response) if isinstance(response, str) else len(json.dumps(response, ensure_ascii=False))
+        args = (time.perf_counter() - t0, queue_wait, attempts, len(final_content), size, outcome)
+        if trace is not None:
+            trace.record_call(agent_name, *args)
+        else:
+            record_call(None, *args)
+
+    if cache_key and use_cache:
+        cached = llm_cache.get(cache_key, cache_kind)
+        if cached is not None:
+            if on_token is not None and not output_json:
+                on_token(cached)
+            measure("cache", cached)
+            return cached
+
+    # Reprises selon le type d'erreur (quota, timeout, JSON invalide), via l'ordonnanceur partagé
+    while True:
+        try:
+            with scheduler.slot(session_id, estimate_tokens(final_content)) as waited:
+                queue_wait += waited
+                if on_token is not None and not output_json:
+                    text_resp = ""
+                    for piece in backend.stream(MODEL_NAME, final_content, generation_config):
+                        text_resp += piece
+                        on_token(text_resp)
+                else:
+                    text_resp = backend.generate(MODEL_NAME, final_content, generation_config)
+            
+            if output_json:
+                # Réparation locale (liste, texte parasite, fin tronquée) : pas de régénération
+                data, repairs = parse_json(text_resp)
+                for repair in repairs:
+                    registry.inc("barelvox_json_repairs_total", kind=repair)
+                if validate is not None:
+                    data = validate(data)
+                # Vérification que c'est bien un dict et qu'il n'est pas vide
+                if data and isinstance(data, dict): 
+                    if cache_key: llm_cache.put(cache_key, cache_kind, data)
+                    measure("ok", text_resp)
+                    return data
+                else: 
+                    raise BadJSONError("JSON invalide ou vide")
+            else:
+                if cache_key: llm_cache.put(cache_key, cache_kind, text_resp)
+                measure("ok", text_resp)
+                return text_resp
+            
+        except Cancelled:
+            raise
+        except Exception as e:
+            kind = classify_error(e)
+            attempts[kind] = attempts.get(kind, 0) + 1
+            
+            if attempts[kind] >= RETRY_POLICY[kind][0]:
+                scheduler.record_retry(failed=True)
+                # SAFE RETURN
+                if output_json:
+                    # Rapport explicite : un segment non analysé n'est jamais présenté comme RAS
+                    missing = {"analyse": f"Non évalué : {agent_name} sans réponse exploitable ({kind}).", "flag": "🟠", "pages": []}
+                    fallback = {"liorah": dict(missing), "ethan": dict(missing), "krypt": dict(missing), "fallback": True}
+                else:
+                    fallback = f"⚠️ **Note Avenor :** Analyse complexe. Détail technique : {str(e)}"
+                measure("fallback", "")
+                return fallback
+            scheduler.record_retry()
+            time.sleep(backoff_delay(kind, attempts[kind]))
+
+
+def phoebe_processing(trinity_report):
+    # Sécurisation si trinity_report n'est pas un dict
+    if not isinstance(trinity_report, dict):
+        return "RAPPORT SYNTHÈSE\nErreur de structure des données."
+    return f"RAPPORT SYNTHÈSE\nDonnées Techniques : {json.dumps(trinity_report, ensure_ascii=False)}"
+
+# --- PROMPTS ---
+P_TRINITE = """
+Tu es la Trinité (Liorah, Ethan, Krypt). Analyse le CCTP.
+**OBJECTIF :** Détecter les marques imposées SANS mention "ou équivalent".
+
+**RÈGLES :**
+1. Si Marque citée SANS "ou équivalent" (même paragraphe) -> 🟠 (Alerte).
+2. Si Marque citée AVEC "ou équivalent" -> 🟢 (RAS).
+3. Chaque page du texte commence par [Page N] : cite ce numéro pour chaque constat,
+   et liste les pages citées dans "pages".
+
+**OUTPUT JSON UNIQUE (PAS DE LISTE) :**
+{
+  "liorah": {"analyse": "[Page X] Marque Y imposée sans équivalence.", "flag": "🟠", "pages": [X]},
+  "ethan": {"analyse": "RAS - Normes DTU respectées.", "flag": "🟢", "pages": []},
+  "krypt": {"analyse": "RAS", "flag": "🟢", "pages": []}
+}
+"""
+
+# Pièce administrative d'un dossier multi-fichiers (voir barelvox.package) : pas de contrôle des marques
+P_TRINITE_CCAP = """
+Tu es la Trinité (Liorah, Ethan, Krypt). Analyse le CCAP.
+**OBJECTIF :** Détecter les clauses contractuelles défavorables à l'entreprise.
+
+**RÈGLES :**
+1. Liorah (juridique) : pénalités sans plafond, délai de paiement au-delà de 30 jours,
+   retenue de garantie au-delà de 5 %, absence de clause de révision des prix -> 🟠 (Alerte).
+2. Ethan (risques) : délais d'exécution, pénalités de retard, assurances exigées hors norme -> 🟠.
+3. Krypt (data) : montants, dates ou durées contradictoires entre articles -> 🟠.
+4. Sinon -> 🟢 (RAS). Ne traite pas les marques : elles relèvent du CCTP.
+5. Chaque page du texte commence par [Page N] : cite ce numéro pour chaque constat,
+   et liste les pages citées dans "pages".
+
+**OUTPUT JSON UNIQUE (PAS DE LISTE) :**
+{
+  "liorah": {"analyse": "[Page X] Art. 4.3 : pénalités de retard sans plafond.", "flag": "🟠", "pages": [X]},
+  "ethan": {"analyse": "RAS", "flag": "🟢", "pages": []},
+  "krypt": {"analyse": "RAS", "flag": "🟢", "pages": []}
+}
+"""
+
+P_AVENOR = """Tu es AVENOR, Directeur BTP. Rédige le verdict.
+
+**LOGIQUE :**
+- Si JSON contient 🟠 ou 🔴 -> Verdict [FLAG : 🟠].
+- Sinon -> [FLAG : 🟢].
+
+**FORMAT MARKDOWN :**
+[FLAG : X]
+
+### 🛡️ VERDICT DU CONSEIL
+**Décision :** [Phrase Expert BTP]
+
+**⚠️ VIGILANCE EXPERTE :**
+* [Reprends les localisations Page/Art précises]
+
+**💡 CONSEIL STRATÉGIQUE :**
+* [Conseil Actionnable : Variantes, Fiches Techniques, Validation Bureau Contrôle]
+"""
+
+P_CHAT_AVENOR = """Tu es AVENOR. Expert BTP, direct et précis.
+Appuie-toi sur le verdict et les extraits du DCE fournis, en citant les pages ([Page N]).
+Si les extraits ne contiennent pas la réponse, dis-le plutôt que de supposer."""
+
+
+def chat_payload(question, verdict, index=None):
+    """Contexte d'une question de chat, de taille bornée : verdict + passages pertinents du DCE."""
+    parts = [f"CONTEXTE DOSSIER:\n{verdict}"]
+    passages = index.context(question) if index is not None else ""
+    if passages:
+        parts.append(f"EXTRAITS DU DCE:\n{passages}")
+    parts.append(f"QUESTION UTILISATEUR:\n{question}")
+    return "\n\n".join(parts)
+
+# --- PIPELINE DU COUNCIL ---
+def stage_evena(ctx):
+    """Lecture : un passage sur le flux de pages (remplit le cache disque au passage).
+
+    Avec ctx["build_index"], l'index de recherche du chat est construit dans le même passage
+    (passages étiquetés par ctx["source"] pour une pièce d'un dossier multi-fichiers).
+    """
+    source = PageSource(ctx["pdf_bytes"])
+    index = DceIndex() if ctx.get("build_index") else None
+    page_hashes = []
+    n_pages = n_chars = 0
+    t0 = time.perf_counter()
+    try:
+        for page in source:
+            n_pages += 1
+            n_chars += len(page.text)
+            page_hashes.append([page.page, page_hash(page.text)])
+            if index is not None:
+                index.add_page(page, ctx.get("source"))
+    except Exception as e:
+        raise ValueError(f"Erreur lecture PDF : {str(e)}")
+    elapsed = time.perf_counter() - t0
+    record_extraction(n_pages, elapsed)
+    trace = ctx.get("trace")
+    if trace is not None:
+        trace.annotate(pages=n_pages, chars=n_chars, page_errors=len(source.errors), pages_per_s=round(n_pages / elapsed, 1) if elapsed else None, extract_cache_hit=source.stats.get("cache_hit"))
+    return {"dce_pages": source, "dce_index": index, "page_hashes": page_hashes, "dce_stats": {"pages": n_pages, "chars": n_chars, "errors": len(source.errors)}}
+
+def stage_keres(ctx):
+    """Sécurisation : texte exploitable, puis pré-scan local des marques citées."""
+    if not ctx["dce_stats"]["chars"]:
+        raise ValueError("Aucun texte exploitable dans le PDF (document scanné ?)")
+    return {"dce_pages": ctx["dce_pages"], "prescan": prescan(ctx["dce_pages"]) if PRESCAN_ENABLED else None}
+
+def stage_trinite(ctx):
+    """Map-reduce : un appel par segment (pages numérotées), fusion au pire flag.
+
+    Avec le pré-scan, seuls les paragraphes candidats partent au modèle ;
+    sans candidat, le rapport est déterministe et aucun appel n'est fait.
+    Un segment déjà analysé (même contenu, numéros de page éventuellement
+    décalés par un addendum) est repris du cache, citations renumérotées.
+    """
+    scan = ctx.get("prescan")
+    if scan is not None and not scan.candidates:
+        return {"trinity_res": scan.deterministic_report(), "trinity_chunks": 0}
+    pages = scan.pages() if scan is not None else ctx["dce_pages"]
+    res, n_chunks, n_reused = analyse_segments(ctx, pages)
+    trace = ctx.get("trace")
+    if trace is not None:
+        trace.annotate(chunks=n_chunks, chunks_reused=n_reused)
+    return {"trinity_res": res, "trinity_chunks": n_chunks, "trinity_reused": n_reused}
+
+def analyse_segments(ctx, pages, role_prompt=P_TRINITE, agent="Trinité"):
+    """Map-reduce d'un flux de pages avec `role_prompt` -> (rapport fusionné, segments, segments repris)."""
+    use_cache = ctx.get("use_cache", True)
+    reused = []
+
+    def analyse_chunk(chunk):
+        # Thread worker : pas d'appel Streamlit ici
+        check_cancelled(ctx.get("cancel_event"))
+        key = chunk_key(chunk, role_prompt) if LLM_CACHE_ENABLED else None
+        if key and use_cache:
+            stored = llm_cache.get(key, "chunk")
+            if stored is not None:
+                reused.append(chunk.index)
+                return renumber_report(stored["report"], stored["pages"], chunk.pages)
+        res = call_gemini_resilient(role_prompt, chunk.text, True, f"{agent} #{chunk.index + 1}", output_json=True, response_schema=TRINITE_SCHEMA, validate=validate_report, use_cache=use_cache, session_id=ctx.get("session_id"), trace=ctx.get("trace"))
+        if key and not res.get("fallback"):
+            llm_cache.put(key, "chunk", {"pages": chunk.pages, "report": res})
+        return res
+
+    res, n_chunks = run_mapreduce(analyse_chunk, iter_chunks(pages))
+    return res, n_chunks, len(reused)
+
+def chunk_key(chunk, role_prompt=P_TRINITE):
+    """Clé d'un résultat de segment : contenu hors numéros de page (voir trinite.iter_chunks)."""
+    return make_key(f"{get_backend().name}:{MODEL_NAME}", {"chunk": TRINITE_SCHEMA}, role_prompt, chunk.fingerprint)
+
+def stage_phoebe(ctx):
+    return {"phoebe_res": phoebe_processing(ctx["trinity_res"])}
+
+def stage_avenor(ctx):
+    res = call_gemini_resilient(P_AVENOR, ctx["phoebe_res"], False, "Avenor", False, ctx.get("status_placeholder"), use_cache=ctx.get("use_cache", True), on_token=ctx.get("on_avenor_token"), session_id=ctx.get("session_id"), trace=ctx.get("trace"))
+    return {"avenor_res": res}
+
+# min_seconds : rythme historique des démos, appliqué uniquement en mode démo
+COUNCIL_STAGES = [
+    Stage("evena", "Evena", "Evena : Lecture...", stage_evena, ["pdf_bytes"], ["dce_pages", "dce_index", "page_hashes", "dce_stats"], min_seconds=11),
+    Stage("keres", "Kérès", "Kérès : Sécurisation...", stage_keres, ["dce_pages", "dce_stats"], ["dce_pages", "prescan"], min_seconds=13),
+    Stage("trinite", "Trinité", "Trinité : Analyse...", stage_trinite, ["dce_pages"], ["trinity_res"], min_seconds=30),
+    Stage("phoebe", "Phoebe", "Phoebe : Synthèse...", stage_phoebe, ["trinity_res"], ["phoebe_res"], min_seconds=8),
+    Stage("avenor", "Avenor", "Avenor : Verdict...", stage_avenor, ["phoebe_res"], ["avenor_res"]),
+]
+
+
+def run_council(pdf_bytes, use_cache=True, pacing=False, on_stage_start=None, on_stage_end=None, status_placeholder=None, on_avenor_token=None, session_id=None, cancel_event=None, build_index=False, name=None):
+    """Exécute le Council complet sur un PDF et renvoie le contexte (résultats, timings, trace).
+
+    `cancel_event` (threading.Event) : annulation coopérative, lève pipeline.Cancelled.
+    `build_index` : construit ctx["dce_index"] (retrieval.DceIndex) pour le chat.
+    `name` : nom du dossier dans l'historique des versions ; ctx["revision"] compare
+    le PDF à sa version précédente (versions.compare_versions), None si inédit.
+    """
+    trace = RunTrace()
+    ctx = {"pdf_bytes": pdf_bytes, "status_placeholder": status_placeholder, "use_cache": use_cache, "on_avenor_token": on_avenor_token, "session_id": session_id, "trace": trace, "cancel_event": cancel_event, "build_index": build_index}
+    try:
+        run_pipeline(COUNCIL_STAGES, ctx, on_stage_start=on_stage_start, on_stage_end=on_stage_end, pacing=pacing, cancel_event=cancel_event)
+    except Cancelled:
+        trace.finish("cancelled")
+        raise
+    except Exception as e:
+        trace.finish("error", str(e))
+        raise
+    ctx["revision"] = record_version(ctx, name) if VERSIONS_ENABLED else None
+    trace.finish("ok")
+    return ctx
+
+
+def record_version(ctx, name):
+    """Rapproche le PDF de sa version précédente (s'il y en a une), puis l'enregistre."""
+    flags = trinity_flags(ctx["trinity_res"])
+    verdict = verdict_flag(ctx["avenor_res"])
+    sha256 = ctx["dce_pages"].sha256
+    previous = version_store.find_previous(sha256, ctx["page_hashes"])
+    version_store.record(sha256, name, ctx["page_hashes"], flags, verdict)
+    return compare_versions(previous, ctx["page_hashes"], flags, verdict) if previous else None
+
+
+def verdict_flag(avenor_res):
+    if "[FLAG : 🔴]" in avenor_res: return "🔴"
+    if "[FLAG : 🟠]" in avenor_res: return "🟠"
+    return "🟢"
+
+
+def trinity_flags(trinity_res):
+    """Flags par expert (Safe Access : 🟢 par défaut)."""
+    if not isinstance(trinity_res, dict):
+        return {expert: "🟢" for expert in ("liorah", "ethan", "krypt")}
+    return {expert: (trinity_res.get(expert) or {}).get("flag", "🟢") for expert in ("liorah", "ethan", "krypt")}
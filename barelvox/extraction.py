@@ -0,0 +1,414 @@
+"""Evena : extraction du texte des DCE, avec cache disque adressé par contenu.
+
+Le document est exposé comme un flux paresseux de pages (`iter_pages`) :
+on ne construit jamais le texte complet sauf si l'appelant le demande.
+"""
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from pypdf import PdfReader
+
+CACHE_DIR = os.environ.get("BAREL_CACHE_DIR", ".cache")
+EXTRACT_CACHE_MB = int(os.environ.get("BAREL_EXTRACT_CACHE_MB", "512"))
+# Extraction parallèle : taille du pool (0/1 = série) et seuil en pages en dessous duquel on reste en série
+EXTRACT_WORKERS = int(os.environ.get("BAREL_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PARALLEL_MIN_PAGES = int(os.environ.get("BAREL_PARALLEL_MIN_PAGES", "64"))
+# Processus d'extraction simultanés pour tout le process (analyses en parallèle, pièces d'un dossier, CLI -j)
+EXTRACT_MAX_PROCESSES = int(os.environ.get("BAREL_EXTRACT_MAX_PROCESSES", str(max(1, EXTRACT_WORKERS))))
+# À incrémenter quand clean_page_text change : les anciennes entrées du cache sont ignorées
+CLEAN_VERSION = 2
+
+# Une page non vide du DCE. start/end : position dans le texte complet
+# tel que le renverrait extract_text_from_bytes (pages séparées par "\n\n").
+PageRecord = namedtuple("PageRecord", ["page", "text", "start", "end"])
+
+
+def pdf_sha256(pdf_bytes):
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def clean_page_text(txt_page):
+    """Recolle les lignes coupées d'un même paragraphe (les doubles sauts restent).
+
+    pypdf rend souvent une ligne vide comme " \n" : on la traite comme un saut de paragraphe.
+    """
+    txt_page = re.sub(r'\n[ \t]+(?=\n)', '\n', txt_page)
+    return re.sub(r'(?<!\n)\n(?!\n)', ' ', txt_page)
+
+
+class ExtractCache:
+    """Cache disque du texte nettoyé, page par page, clé = SHA-256 du PDF.
+
+    Une entrée est un fichier JSON Lines (une page par ligne) relu en flux ; les
+    erreurs d'extraction éventuelles suivent en dernière ligne ({"errors": [...]}).
+    Éviction LRU bornée en taille : le mtime d'une entrée est rafraîchi à chaque hit.
+    Partagé entre sessions et redémarrages puisque tout est sur disque.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._prefetched = set()
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.v{CLEAN_VERSION}.jsonl")
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def mark_prefetched(self, keys):
+        """Entrées écrites par prefetch : leur première lecture compte comme un miss (extraction faite pour ce dossier)."""
+        with self._lock:
+            self._prefetched.update(keys)
+
+    def get(self, key, record=True, errors=None):
+        """Itérateur sur les textes de pages en cache, ou None.
+
+        `record=False` : relecture d'un document déjà compté (hits/misses par document, pas par parcours).
+        Les erreurs de pages enregistrées avec l'entrée sont ajoutées à `errors`.
+        """
+        path = self._path(key)
+        try:
+            f = open(path, "r", encoding="utf-8")
+            os.utime(path)
+        except OSError:
+            if record:
+                with self._lock:
+                    self.misses += 1
+            return None
+        if record:
+            with self._lock:
+                if key in self._prefetched:
+                    self._prefetched.discard(key)
+                    self.misses += 1
+                else:
+                    self.hits += 1
+        return self._read(f, errors)
+
+    @staticmethod
+    def _read(f, errors):
+        with f:
+            for line in f:
+                value = json.loads(line)
+                if isinstance(value, dict):
+                    if errors is not None:
+                        errors.extend(value.get("errors", []))
+                    continue
+                yield value
+
+    def writer(self, key):
+        try:
+            return _CacheWriter(self, key)
+        except OSError:
+            # Cache best-effort : un disque plein ne doit pas casser l'analyse
+            return None
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".tmp"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        total = sum(e[1] for e in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+                total -= size
+            except OSError:
+                pass
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class _CacheWriter:
+    """Écriture d'une entrée au fil de l'extraction, publiée atomiquement par commit()."""
+
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.path = cache._path(key)
+        os.makedirs(cache.directory, exist_ok=True)
+        self.tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self.f = open(self.tmp, "w", encoding="utf-8")
+
+    def write(self, text):
+        if self.f is None:
+            return
+        try:
+            self.f.write(json.dumps(text, ensure_ascii=False) + "\n")
+        except OSError:
+            self.discard()
+
+    def write_errors(self, errors):
+        """Erreurs de pages (déterministes pour un PDF donné) gardées avec l'entrée."""
+        self.write({"errors": errors})
+
+    def commit(self):
+        """Publie l'entrée ; renvoie False si elle n'a pas pu l'être."""
+        if self.f is None:
+            return False
+        try:
+            self.f.close()
+            self.f = None
+            os.replace(self.tmp, self.path)
+        except OSError:
+            self.discard()
+            return False
+        try:
+            self.cache.evict()
+        except OSError:
+            pass
+        return True
+
+    def discard(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+        try:
+            os.remove(self.tmp)
+        except OSError:
+            pass
+
+
+extract_cache = ExtractCache(os.path.join(CACHE_DIR, "extract"), EXTRACT_CACHE_MB * 1024 * 1024)
+
+
+def _extract_range(reader, start, stop):
+    """Extrait et nettoie les pages [start, stop). Une page en erreur devient "" sans perdre les autres."""
+    pages, errors = [], []
+    for index in range(start, stop):
+        try:
+            txt_page = reader.pages[index].extract_text()
+            pages.append(clean_page_text(txt_page) if txt_page else "")
+        except Exception as e:
+            pages.append("")
+            errors.append(f"Page {index + 1} : {e}")
+    return pages, errors
+
+
+# --- POOL DE PROCESSUS ---
+# Budget commun à tous les pools : chaque extraction réserve ses processus sans attendre,
+# et reste en série si moins de deux sont libres (jamais N pools × cpu_count interpréteurs).
+_process_slots = threading.Semaphore(max(1, EXTRACT_MAX_PROCESSES))
+
+def _reserve_processes(wanted):
+    """Réserve jusqu'à `wanted` processus du budget ; renvoie le nombre obtenu (0 ou >= 2)."""
+    got = 0
+    while got < wanted and _process_slots.acquire(blocking=False):
+        got += 1
+    if got < 2:
+        _release_processes(got)
+        return 0
+    return got
+
+def _release_processes(n):
+    for _ in range(n):
+        _process_slots.release()
+
+# Chaque worker reçoit les bytes une seule fois (initializer), les tâches ne transportent que des bornes.
+_worker_reader = None
+
+def _init_worker(pdf_bytes):
+    global _worker_reader
+    _worker_reader = PdfReader(io.BytesIO(pdf_bytes))
+
+def _extract_span(span):
+    start, stop = span
+    return _extract_range(_worker_reader, start, stop)
+
+
+def _iter_parallel(pdf_bytes, n_pages, workers):
+    """Tranches extraites en parallèle, rendues dans l'ordre des pages dès qu'elles sont prêtes."""
+    workers = min(workers, n_pages)
+    # ~4 tranches par worker pour lisser les pages lourdes (plans, tableaux)
+    step = max(1, -(-n_pages // (workers * 4)))
+    spans = [(s, min(s + step, n_pages)) for s in range(0, n_pages, step)]
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker, initargs=(pdf_bytes,)) as pool:
+        yield from pool.map(_extract_span, spans)
+
+
+def _iter_texts(pdf_bytes, workers, errors):
+    """Textes de toutes les pages, dans l'ordre. Lève si le PDF est illisible."""
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    n_pages = len(reader.pages)
+    done = 0
+    slots = _reserve_processes(min(workers, n_pages)) if workers > 1 and n_pages >= PARALLEL_MIN_PAGES else 0
+    try:
+        if slots:
+            for span_pages, span_errors in _iter_parallel(pdf_bytes, n_pages, slots):
+                errors.extend(span_errors)
+                for text in span_pages:
+                    done += 1
+                    yield text
+    except Exception:
+        # Pool indisponible (sandbox, ressources) : on reprend en série là où on en était
+        pass
+    finally:
+        _release_processes(slots)
+    for start in range(done, n_pages):
+        span_pages, span_errors = _extract_range(reader, start, start + 1)
+        errors.extend(span_errors)
+        yield span_pages[0]
+
+
+def _iter_extracted(pdf_bytes, key, cache, workers, errors, stats=None):
+    page_errors = []
+    writer = cache.writer(key) if cache is not None else None
+    if stats is not None:
+        stats["caching"] = writer is not None
+    try:
+        for text in _iter_texts(pdf_bytes, workers, page_errors):
+            if writer:
+                writer.write(text)
+            yield text
+        # Pages en erreur figées avec leurs erreurs : une relecture ne repasse pas par pypdf
+        if writer and page_errors:
+            writer.write_errors(page_errors)
+        if writer and writer.commit() and stats is not None:
+            stats["cached"] = True
+    finally:
+        if writer:
+            writer.discard()
+        if errors is not None:
+            errors.extend(page_errors)
+
+
+def iter_pages(pdf_bytes, cache=extract_cache, workers=None, errors=None, stats=None, record=True):
+    """Flux paresseux de PageRecord pour les pages non vides du DCE.
+
+    Sur un hit, les pages sont relues en flux depuis le cache sans toucher à pypdf.
+    Sinon elles sont extraites (en parallèle au-delà de PARALLEL_MIN_PAGES) et
+    écrites au fil de l'eau dans le cache. Les erreurs par page vont dans `errors`,
+    `stats["cache_hit"]` indique si le parcours a été servi par le cache,
+    `stats["caching"]` si une extraction l'écrit et `stats["cached"]` si le texte
+    y est (déjà ou désormais). `record` : voir ExtractCache.get.
+    """
+    key = pdf_sha256(pdf_bytes)
+    texts = cache.get(key, record, errors) if cache is not None else None
+    if stats is not None:
+        stats["cache_hit"] = stats["cached"] = texts is not None
+    if texts is None:
+        workers = EXTRACT_WORKERS if workers is None else workers
+        texts = _iter_extracted(pdf_bytes, key, cache, workers, errors, stats)
+
+    offset = 0
+    for page_no, text in enumerate(texts, 1):
+        if text:
+            yield PageRecord(page_no, text, offset, offset + len(text))
+            offset += len(text) + 2
+
+
+def _warm_document(args):
+    """Worker : extraction série d'un document entier vers le cache disque."""
+    pdf_bytes, directory, max_bytes = args
+    for _ in iter_pages(pdf_bytes, ExtractCache(directory, max_bytes), workers=1):
+        pass
+
+
+def prefetch(documents, cache=extract_cache, workers=None):
+    """Extrait plusieurs PDF en parallèle (un document par process) vers le cache disque.
+
+    Pour un dossier de plusieurs pièces : seules celles absentes du cache et sous
+    PARALLEL_MIN_PAGES sont concernées (les grosses pièces ont déjà leur extraction
+    par tranches). Le premier parcours (PageSource) d'une pièce extraite ici compte
+    comme un miss, les suivants ne comptent pas. Best-effort :
+    en cas d'échec, l'extraction se fait au premier parcours. Renvoie le nombre de PDF extraits.
+    """
+    workers = EXTRACT_WORKERS if workers is None else workers
+    if cache is None or workers <= 1:
+        return 0
+    todo, keys = [], []
+    for pdf_bytes in documents:
+        key = pdf_sha256(pdf_bytes)
+        if key in cache:
+            continue
+        try:
+            n_pages = len(PdfReader(io.BytesIO(pdf_bytes)).pages)
+        except Exception:
+            continue
+        if n_pages < PARALLEL_MIN_PAGES:
+            todo.append((pdf_bytes, cache.directory, cache.max_bytes))
+            keys.append(key)
+    slots = _reserve_processes(min(workers, len(todo))) if len(todo) >= 2 else 0
+    if not slots:
+        return 0
+    ctx = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(slots, mp_context=ctx) as pool:
+            list(pool.map(_warm_document, todo))
+    except Exception:
+        return 0
+    finally:
+        _release_processes(slots)
+    cache.mark_prefetched(keys)
+    return len(todo)
+
+
+class PageSource:
+    """Source de pages ré-itérable pour le pipeline.
+
+    Chaque parcours relit le cache disque (le premier le remplit) : on ne garde
+    pas le document en mémoire entre deux étapes. Sans cache (absent ou dossier
+    inutilisable), les pages du premier parcours sont gardées en mémoire pour
+    les suivants : jamais deux extractions pypdf du même document. Seul le premier
+    parcours compte dans les hits/misses du cache et dans `stats`.
+    """
+
+    def __init__(self, pdf_bytes, cache=extract_cache, workers=None):
+        self.pdf_bytes = pdf_bytes
+        self.cache = cache
+        self.workers = workers
+        self.sha256 = pdf_sha256(pdf_bytes)
+        self.errors = []
+        self.stats = {}
+        self._pages = None
+        self._read_once = False
+
+    def __iter__(self):
+        if self._pages is not None:
+            return iter(self._pages)
+        return self._iter_pass()
+
+    def _iter_pass(self):
+        first = not self._read_once
+        stats = self.stats if first else {}
+        # Erreurs du dernier parcours seulement (pas de doublons d'un parcours à l'autre)
+        del self.errors[:]
+        pages = []
+        for page in iter_pages(self.pdf_bytes, self.cache, self.workers, self.errors, stats, record=first):
+            # Tampon seulement quand aucune entrée de cache n'est écrite
+            if not stats.get("cache_hit") and not stats.get("caching"):
+                pages.append(page)
+            yield page
+        self._read_once = True
+        if not stats.get("cache_hit") and not stats.get("caching"):
+            self._pages = pages
+
+
+def pages_to_text(pages):
+    """Reconstruit le texte d'un flux de pages (format historique d'Evena)."""
+    return "".join(p.text + "\n\n" for p in pages)
+
+
+def extract_text_from_bytes(pdf_bytes, cache=extract_cache):
+    try:
+        return pages_to_text(iter_pages(pdf_bytes, cache))
+    except Exception as e:
+        return f"Erreur lecture PDF : {str(e)}"
@@ -0,0 +1,141 @@
+"""Analyses en tâche de fond : pool borné partagé par tout le process.
+
+Le script Streamlit ne fait que soumettre et suivre : une interaction dans le
+navigateur ne coupe plus l'analyse, et une session n'occupe plus de thread
+serveur pendant des minutes. Les tâches terminées restent récupérables
+JOB_TTL secondes (rechargement d'onglet : l'id est aussi dans l'URL), et sont
+oubliées dès que la session a repris leur résultat (index du DCE compris).
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from barelvox.pipeline import Cancelled
+
+JOB_WORKERS = int(os.environ.get("BAREL_JOB_WORKERS", "4"))
+JOB_TTL = int(os.environ.get("BAREL_JOB_TTL", "3600"))
+
+FINISHED = ("done", "error", "cancelled")
+
+
+class Job:
+    """Une analyse soumise. `fn(job)` tourne dans le pool et publie son avancement via le job.
+
+    Aucun appel Streamlit côté worker : l'UI relit status/progress/logs/partial.
+    """
+
+    def __init__(self, fn, label="", owner=None):
+        self.id = uuid.uuid4().hex
+        self.label = label
+        self.owner = owner
+        self.status = "queued"
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.progress = 0
+        self.stage = ""
+        self.logs = []
+        self.partial = ""
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self._fn = fn
+        self._future = None
+
+    @property
+    def done(self):
+        return self.status in FINISHED
+
+    def update(self, progress, stage):
+        self.progress = progress
+        self.stage = stage
+
+    def log(self, line):
+        self.logs.append(line)
+
+    def stream(self, text):
+        """Callback de streaming : aperçu du texte reçu ; sert aussi de point d'annulation."""
+        if self.cancel_event.is_set():
+            raise Cancelled("Analyse annulée")
+        self.partial = text
+
+    def cancel(self):
+        """Annulation : immédiate si la tâche attend encore, au prochain point de contrôle sinon."""
+        self.cancel_event.set()
+        if self._future is not None and self._future.cancel():
+            self._finish("cancelled")
+
+    def _finish(self, status, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.finished = time.time()
+        self._fn = None  # libère les bytes du PDF
+        self.status = status
+
+    def _run(self):
+        if self.cancel_event.is_set():
+            self._finish("cancelled")
+            return
+        self.status = "running"
+        self.started = time.time()
+        try:
+            result = self._fn(self)
+        except Cancelled:
+            self._finish("cancelled")
+        except Exception as e:
+            self._finish("error", error=str(e))
+        else:
+            self._finish("done", result=result)
+
+
+class JobManager:
+    def __init__(self, max_workers=JOB_WORKERS, ttl=JOB_TTL):
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="barelvox-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, label="", owner=None):
+        self._purge()
+        job = Job(fn, label, owner)
+        with self._lock:
+            self._jobs[job.id] = job
+        job._future = self._pool.submit(job._run)
+        return job
+
+    def get(self, job_id):
+        self._purge()
+        if not job_id:
+            return None
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def forget(self, job_id):
+        """Retire une tâche terminée dont le résultat a été repris : sa mémoire est libérée sans attendre le TTL."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.done:
+                del self._jobs[job_id]
+
+    def position(self, job):
+        """Nombre de tâches en attente soumises avant `job`."""
+        with self._lock:
+            return sum(1 for other in self._jobs.values() if other.status == "queued" and other.created < job.created)
+
+    def _purge(self):
+        limit = time.time() - self.ttl
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.done and j.finished < limit]:
+                del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            counts = {status: 0 for status in ("queued", "running") + FINISHED}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return counts
+
+
+jobs = JobManager()
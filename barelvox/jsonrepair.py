@@ -0,0 +1,80 @@
+"""Lecture tolérante des réponses JSON du modèle, en une passe et sans nouvel appel.
+
+Défauts réparés : texte ou balises ``` autour du JSON, liste enveloppante,
+texte après l'objet, fin tronquée (chaîne, tableau ou objet non fermés),
+retours à la ligne bruts dans les chaînes.
+"""
+import json
+import re
+
+_DECODER = json.JSONDecoder(strict=False)
+_CLOSERS = {"{": "}", "[": "]"}
+# Chaînes entières (groupe 1 absent si non fermée) ou ponctuation structurelle
+_TOKEN_RE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*(")?|[{}\[\],]', re.DOTALL)
+# Points de coupe (virgules) essayés en remontant quand la fin tronquée ne se referme pas telle quelle
+MAX_CUTS = 3
+
+
+def _start(text):
+    """Début du JSON : premier "{", ou le "[" qui l'enveloppe directement."""
+    brace = text.find("{")
+    if brace < 0:
+        return -1
+    bracket = text.rfind("[", 0, brace)
+    if bracket >= 0 and not text[bracket + 1:brace].strip():
+        return bracket
+    return brace
+
+
+def _close_truncated(text, start):
+    """Referme un JSON tronqué ; renvoie l'objet décodé ou None."""
+    stack, cuts, tail = [], [], None
+    for m in _TOKEN_RE.finditer(text, start):
+        token = m.group()
+        if token[0] == '"':
+            if m.group(1) is None:
+                # Chaîne ouverte jusqu'à la coupure (un "\" final orphelin est abandonné)
+                tail = text[start:m.end()] + '"'
+            continue
+        if token in _CLOSERS:
+            stack.append(_CLOSERS[token])
+        elif token == ",":
+            cuts.append((m.start(), "".join(reversed(stack))))
+        elif not stack or stack.pop() != token:
+            return None
+    if tail is None:
+        tail = text[start:]
+    candidates = [tail + "".join(reversed(stack))]
+    candidates += [text[start:i] + closers for i, closers in reversed(cuts[-MAX_CUTS:])]
+    for candidate in candidates:
+        try:
+            return _DECODER.decode(candidate)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_json(text):
+    """Renvoie (données, réparations appliquées) ; données None si rien d'exploitable.
+
+    Réparations possibles : "list_wrapper", "trailing_text", "truncated_tail".
+    """
+    repairs = []
+    if not isinstance(text, str):
+        return None, repairs
+    start = _start(text)
+    if start < 0:
+        return None, repairs
+    try:
+        data, end = _DECODER.raw_decode(text, start)
+        if text[end:].strip().strip("`").strip():
+            repairs.append("trailing_text")
+    except ValueError:
+        data = _close_truncated(text, start)
+        if data is None:
+            return None, repairs
+        repairs.append("truncated_tail")
+    if isinstance(data, list):
+        repairs.append("list_wrapper")
+        data = next((item for item in data if isinstance(item, dict)), None)
+    return data, repairs
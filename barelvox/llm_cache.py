@@ -0,0 +1,109 @@
+"""Cache persistant des réponses modèle, partagé entre sessions (SQLite sur disque).
+
+Clé : modèle + configuration de génération + prompt de rôle + hash du contenu.
+Les réponses texte ("text") et les objets JSON (toute autre sorte : "json",
+résultats de segments Trinité "chunk"...) sont stockés séparément.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from barelvox.extraction import CACHE_DIR
+
+LLM_CACHE_ENABLED = os.environ.get("BAREL_LLM_CACHE", "1") != "0"
+LLM_CACHE_TTL = int(os.environ.get("BAREL_LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MB = int(os.environ.get("BAREL_LLM_CACHE_MB", "64"))
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_key(model_name, generation_config, role_prompt, content_sha):
+    raw = json.dumps([model_name, generation_config or {}, role_prompt, content_sha], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """TTL + éviction par taille (les entrées les moins récemment lues partent d'abord)."""
+
+    def __init__(self, path, ttl, max_bytes):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Schéma vérifié à chaque connexion (peu coûteux) : un .cache vidé pendant que l'app tourne est recréé
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT NOT NULL, kind TEXT NOT NULL, value TEXT NOT NULL,"
+            " size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL,"
+            " PRIMARY KEY (key, kind))"
+        )
+        return conn
+
+    def get(self, key, kind):
+        """Valeur en cache ("text" : chaîne, autres sortes : objet parsé), ou None."""
+        now = time.time()
+        try:
+            conn = self._connect()
+            with conn:
+                row = conn.execute(
+                    "SELECT value FROM responses WHERE key = ? AND kind = ? AND created > ?",
+                    (key, kind, now - self.ttl),
+                ).fetchone()
+                if row:
+                    conn.execute("UPDATE responses SET accessed = ? WHERE key = ? AND kind = ?", (now, key, kind))
+            conn.close()
+        except sqlite3.Error:
+            row = None
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if not row:
+            return None
+        return row[0] if kind == "text" else json.loads(row[0])
+
+    def put(self, key, kind, value):
+        raw = value if kind == "text" else json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, kind, raw, len(raw.encode("utf-8")), now, now),
+                )
+                self._evict(conn, now)
+            conn.close()
+        except sqlite3.Error:
+            # Cache best-effort : une base verrouillée ou un disque plein ne bloque pas l'analyse
+            pass
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, kind, size in conn.execute("SELECT key, kind, size FROM responses ORDER BY accessed").fetchall():
+            conn.execute("DELETE FROM responses WHERE key = ? AND kind = ?", (key, kind))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+llm_cache = LLMCache(os.path.join(CACHE_DIR, "llm.sqlite3"), LLM_CACHE_TTL, LLM_CACHE_MB * 1024 * 1024)
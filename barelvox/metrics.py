@@ -0,0 +1,207 @@
+"""Instrumentation du Council : mesures par étape et par appel modèle.
+
+- `RunTrace` : trace d'une analyse (étapes, appels modèle), portée par le contexte du pipeline ;
+- `registry` : compteurs cumulés du process, exportés au format texte Prometheus.
+
+Exports optionnels : BAREL_METRICS_LOG (JSON Lines, une ligne par analyse) et
+BAREL_METRICS_PROM (fichier texte Prometheus réécrit après chaque analyse,
+pour le collecteur textfile de node_exporter).
+"""
+import json
+import os
+import threading
+import time
+import uuid
+
+METRICS_LOG = os.environ.get("BAREL_METRICS_LOG", "")
+METRICS_PROM = os.environ.get("BAREL_METRICS_PROM", "")
+
+# nom -> (type, aide)
+METRICS = {
+    "barelvox_runs_total": ("counter", "Analyses du Council terminées, par issue."),
+    "barelvox_stage_seconds_sum": ("counter", "Temps de travail cumulé par étape (hors rythme démo)."),
+    "barelvox_stage_seconds_count": ("counter", "Nombre d'exécutions par étape."),
+    "barelvox_pages_total": ("counter", "Pages non vides lues par Evena."),
+    "barelvox_extract_seconds_sum": ("counter", "Temps cumulé de lecture des DCE."),
+    "barelvox_extract_pages_per_second": ("gauge", "Débit de lecture de la dernière analyse."),
+    "barelvox_model_calls_total": ("counter", "Appels modèle par étape et issue (ok, cache, fallback)."),
+    "barelvox_model_call_seconds_sum": ("counter", "Durée cumulée des appels modèle (attente comprise)."),
+    "barelvox_model_queue_wait_seconds_sum": ("counter", "Attente cumulée dans l'ordonnanceur (file, quotas)."),
+    "barelvox_model_retries_total": ("counter", "Reprises d'appels modèle, par type d'erreur."),
+    "barelvox_model_prompt_tokens_total": ("counter", "Tokens envoyés (estimation ~4 caractères/token)."),
+    "barelvox_model_response_tokens_total": ("counter", "Tokens reçus (estimation ~4 caractères/token)."),
+    "barelvox_json_repairs_total": ("counter", "Réponses JSON réparées localement, par défaut corrigé."),
+    "barelvox_cache_hits_total": ("counter", "Hits des caches (extract, llm)."),
+    "barelvox_cache_misses_total": ("counter", "Miss des caches (extract, llm)."),
+    "barelvox_scheduler_inflight": ("gauge", "Appels modèle en cours."),
+    "barelvox_scheduler_waiting": ("gauge", "Appels modèle en file d'attente."),
+    "barelvox_jobs": ("gauge", "Analyses en tâche de fond, par statut."),
+}
+
+
+def _tokens(chars):
+    return chars // 4 + 1 if chars else 0
+
+
+class Registry:
+    """Séries Prometheus du process : (nom, labels) -> valeur."""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._values[(name, tuple(sorted(labels.items())))] = value
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        """Texte au format d'exposition Prometheus, jauges live (caches, file) comprises."""
+        from barelvox.extraction import extract_cache
+        from barelvox.jobs import jobs
+        from barelvox.llm_cache import llm_cache
+        from barelvox.scheduler import scheduler
+        values = self.snapshot()
+        for cache, stats in (("extract", extract_cache.stats()), ("llm", llm_cache.stats())):
+            values[("barelvox_cache_hits_total", (("cache", cache),))] = stats["hits"]
+            values[("barelvox_cache_misses_total", (("cache", cache),))] = stats["misses"]
+        sched = scheduler.stats()
+        values[("barelvox_scheduler_inflight", ())] = sched["inflight"]
+        values[("barelvox_scheduler_waiting", ())] = sched["waiting"]
+        for status, count in jobs.stats().items():
+            values[("barelvox_jobs", (("status", status),))] = count
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            series = sorted((labels, v) for (n, labels), v in values.items() if n == name)
+            if not series:
+                continue
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for labels, value in series:
+                label_str = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{name}{{{label_str}}} {value:g}" if label_str else f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class RunTrace:
+    """Mesures d'une analyse. Thread-safe : les segments Trinité enregistrent en parallèle.
+
+    Les appels modèle sont rattachés à l'étape en cours (le pipeline est séquentiel).
+    """
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self.current_stage = None
+        self.stages = {}
+        self.calls = []
+        self.outcome = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    def start_stage(self, key):
+        with self._lock:
+            self.current_stage = key
+            self.stages[key] = {"seconds": None}
+
+    def end_stage(self, key, seconds):
+        with self._lock:
+            self.stages[key]["seconds"] = round(seconds, 4)
+            self.current_stage = None
+        registry.inc("barelvox_stage_seconds_sum", seconds, stage=key)
+        registry.inc("barelvox_stage_seconds_count", stage=key)
+
+    def annotate(self, **values):
+        """Mesures propres à l'étape en cours (pages, débit, hit de cache...)."""
+        with self._lock:
+            if self.current_stage is not None:
+                self.stages[self.current_stage].update(values)
+
+    def record_call(self, agent, seconds, queue_wait, retries, prompt_chars, response_chars, outcome):
+        """Un appel modèle terminé ; `retries` : {type d'erreur: nombre}."""
+        with self._lock:
+            stage = self.current_stage
+            self.calls.append({
+                "stage": stage, "agent": agent, "seconds": round(seconds, 4), "queue_wait": round(queue_wait, 4),
+                "retries": dict(retries), "prompt_chars": prompt_chars, "prompt_tokens": _tokens(prompt_chars),
+                "response_chars": response_chars, "response_tokens": _tokens(response_chars), "outcome": outcome,
+            })
+        record_call(stage, seconds, queue_wait, retries, prompt_chars, response_chars, outcome)
+
+    def finish(self, outcome="ok", error=None):
+        self.outcome = outcome
+        self.error = error
+        registry.inc("barelvox_runs_total", outcome=outcome)
+        export(self)
+
+    def summary(self):
+        """Vue JSON : étapes avec leurs appels agrégés, puis le détail des appels."""
+        with self._lock:
+            calls = list(self.calls)
+            stages = {key: dict(values) for key, values in self.stages.items()}
+        for key, values in stages.items():
+            mine = [c for c in calls if c["stage"] == key]
+            if not mine:
+                continue
+            values.update({
+                "model_calls": len(mine),
+                "model_seconds": round(sum(c["seconds"] for c in mine), 4),
+                "queue_wait": round(sum(c["queue_wait"] for c in mine), 4),
+                "retries": sum(sum(c["retries"].values()) for c in mine),
+                "prompt_tokens": sum(c["prompt_tokens"] for c in mine),
+                "response_tokens": sum(c["response_tokens"] for c in mine),
+                "cache_hits": sum(c["outcome"] == "cache" for c in mine),
+            })
+        return {
+            "run_id": self.run_id,
+            "started": self.started,
+            "outcome": self.outcome,
+            "error": self.error,
+            "stages": stages,
+            "calls": calls,
+        }
+
+
+def record_call(stage, seconds, queue_wait, retries, prompt_chars, response_chars, outcome):
+    """Compteurs du process pour un appel (aussi utilisé hors analyse, ex. le chat)."""
+    stage = stage or "chat"
+    registry.inc("barelvox_model_calls_total", stage=stage, outcome=outcome)
+    registry.inc("barelvox_model_call_seconds_sum", seconds, stage=stage)
+    registry.inc("barelvox_model_queue_wait_seconds_sum", queue_wait, stage=stage)
+    for kind, count in retries.items():
+        registry.inc("barelvox_model_retries_total", count, stage=stage, kind=kind)
+    registry.inc("barelvox_model_prompt_tokens_total", _tokens(prompt_chars), stage=stage)
+    registry.inc("barelvox_model_response_tokens_total", _tokens(response_chars), stage=stage)
+
+
+def record_extraction(pages, seconds):
+    registry.inc("barelvox_pages_total", pages)
+    registry.inc("barelvox_extract_seconds_sum", seconds)
+    if seconds > 0:
+        registry.set("barelvox_extract_pages_per_second", pages / seconds)
+
+
+def export(trace):
+    """Journal JSON et fichier Prometheus, si configurés. Best-effort : jamais bloquant pour l'analyse."""
+    try:
+        if METRICS_LOG:
+            with open(METRICS_LOG, "a", encoding="utf-8") as f:
+                f.write(json.dumps(trace.summary(), ensure_ascii=False) + "\n")
+        if METRICS_PROM:
+            tmp = f"{METRICS_PROM}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(registry.render())
+            os.replace(tmp, METRICS_PROM)
+    except OSError:
+        pass
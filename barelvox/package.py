@@ -0,0 +1,295 @@
+"""Dossier DCE multi-pièces (plusieurs PDF ou une archive ZIP) : tri, lecture parallèle, un seul verdict.
+
+Chaque pièce est classée d'après son nom, puis ses premières pages (RC, CCAP,
+CCTP par lot, BPU, plans...). Seules les pièces utiles sont lues et analysées :
+les CCTP passent au contrôle des marques (Trinité complète, pré-scan compris),
+le CCAP à l'analyse contractuelle (P_TRINITE_CCAP) ; plans, bordereaux et
+pièces de forme sont écartés sans extraction. Les rapports par pièce sont
+étiquetés puis fusionnés pour une seule synthèse Phoebe et un seul verdict.
+"""
+import io
+import os
+import re
+import time
+import unicodedata
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from pypdf import PdfReader
+
+from barelvox.engine import P_TRINITE_CCAP, analyse_segments, phoebe_processing, stage_avenor, stage_evena, stage_keres, stage_trinite, trinity_flags
+from barelvox.extraction import clean_page_text, extract_cache, pdf_sha256, prefetch
+from barelvox.metrics import RunTrace
+from barelvox.pipeline import Cancelled, Stage, check_cancelled, run_pipeline
+from barelvox.retrieval import DceIndex
+from barelvox.trinite import EXPERTS, TRINITE_WORKERS, merge_reports
+
+# Taille décompressée maximale d'une archive (garde-fou contre les ZIP piégés)
+ZIP_MAX_MB = int(os.environ.get("BAREL_ZIP_MAX_MB", "500"))
+# Pages lues pour classer une pièce au nom peu parlant
+CLASSIFY_PAGES = 2
+
+# Type de pièce : motif cherché dans le nom puis dans le texte ; le plus tôt trouvé l'emporte
+DOCUMENT_KINDS = [
+    ("cctp", r"\bcctp\b|cahier des clauses techniques particulieres"),
+    ("ccap", r"\bccap\b|cahier des clauses administratives particulieres"),
+    ("rc", r"\brc\b|reglement de (?:la )?consultation"),
+    ("ae", r"\bae\b|acte d engagement"),
+    ("bpu", r"\bbpu\b|bordereau des prix"),
+    ("dpgf", r"\bdpgf\b|decomposition du prix global"),
+    ("dqe", r"\bdqe\b|detail quantitatif"),
+]
+# Plans : reconnus au nom seulement. Le mot "plan" est partout dans un CCTP, et une pièce
+# presque sans texte peut être un CCTP scanné : elle doit être signalée (Kérès), pas écartée.
+_PLAN_NAME_RE = re.compile(r"\bplans?\b|\bdwg\b|\bcoupes?\b|\bfacades?\b")
+_KIND_RES = [(kind, re.compile(pattern)) for kind, pattern in DOCUMENT_KINDS]
+_LOT_RE = re.compile(r"\blot\s*(?:n\s*)?0*(\d+)\b")
+
+# Analyse par type : "marques" (CCTP) ou "contrat" (CCAP) ; absent = pièce écartée.
+# Une pièce non reconnue est traitée comme un CCTP : mieux vaut un appel de trop qu'une marque manquée.
+ROUTES = {"cctp": "marques", "ccap": "contrat", "autre": "marques"}
+
+Document = namedtuple("Document", ["name", "pdf_bytes", "kind", "lot"])
+# Pièce utile mais non analysée (PDF corrompu, scan sans texte), avec la raison affichée
+Unreadable = namedtuple("Unreadable", ["document", "reason"])
+
+
+def _normalize(text):
+    text = unicodedata.normalize("NFKD", text.casefold()).encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+
+def expand_uploads(files, max_bytes=ZIP_MAX_MB * 1024 * 1024):
+    """[(nom, bytes)] déposés -> [(nom, bytes)] des PDF, archives ZIP dépliées (un niveau)."""
+    documents = []
+    for name, data in files:
+        if data[:4] == b"PK\x03\x04" or name.lower().endswith(".zip"):
+            documents.extend(_unzip(name, data, max_bytes))
+        elif data[:5] == b"%PDF-" or name.lower().endswith(".pdf"):
+            documents.append((os.path.basename(name), data))
+    return documents
+
+
+def _unzip(name, data, max_bytes):
+    """PDF d'une archive, chemin interne comme nom (il porte souvent le lot : "Lot 03/CCTP.pdf")."""
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir() and info.filename.lower().endswith(".pdf")
+            and not info.filename.startswith("__MACOSX/") and not os.path.basename(info.filename).startswith(".")
+        ]
+        if sum(info.file_size for info in members) > max_bytes:
+            raise ValueError(f"Archive {name} trop volumineuse une fois décompressée (> {max_bytes // (1024 * 1024)} Mo)")
+        return [(info.filename, archive.read(info)) for info in sorted(members, key=lambda info: info.filename)]
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Archive ZIP illisible : {name} ({e})")
+
+
+def _first_pages_text(pdf_bytes, n_pages=CLASSIFY_PAGES):
+    """Texte des premières pages (lecture directe, sans cache) ; "" si le PDF est illisible."""
+    try:
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        return "\n".join(clean_page_text(reader.pages[i].extract_text() or "") for i in range(min(n_pages, len(reader.pages))))
+    except Exception:
+        return ""
+
+
+def _match_kind(text):
+    found = [(m.start(), kind) for kind, regex in _KIND_RES for m in [regex.search(text)] if m]
+    return min(found)[1] if found else None
+
+
+def classify(name, pdf_bytes):
+    """(type, lot) d'une pièce : nom du fichier d'abord, premières pages sinon."""
+    norm_name = _normalize(os.path.splitext(name)[0])
+    kind = _match_kind(norm_name)
+    if kind is None and _PLAN_NAME_RE.search(norm_name):
+        kind = "plan"
+    lot = _LOT_RE.search(norm_name)
+    if kind is None or lot is None:
+        text = _first_pages_text(pdf_bytes)
+        norm_text = _normalize(text)
+        if kind is None:
+            kind = _match_kind(norm_text[:2000]) or "autre"
+        if lot is None:
+            lot = _LOT_RE.search(norm_text[:2000])
+    return kind, lot.group(1) if lot else None
+
+
+def classify_documents(files):
+    """[(nom, bytes)] -> [Document]. Une pièce seule est toujours analysée comme un CCTP (comportement historique)."""
+    if len(files) == 1:
+        name, data = files[0]
+        return [Document(name, data, "cctp", None)]
+    return [Document(name, data, *classify(name, data)) for name, data in files]
+
+
+def describe(doc):
+    """Libellé court d'une pièce pour les logs : "CCTP lot 3 (Lot03/CCTP.pdf)"."""
+    kind = doc.kind.upper() if doc.kind not in ("autre", "plan") else doc.kind.capitalize()
+    return f"{kind}{f' lot {doc.lot}' if doc.lot else ''} ({doc.name})"
+
+
+def describe_unreadable(item):
+    """Libellé d'une pièce non analysée, raison comprise."""
+    return f"{describe(item.document)} : {item.reason}"
+
+
+def label_report(report, label):
+    """Rapport d'une pièce prêt à fusionner : constats préfixés par la pièce, pages propres à la pièce retirées."""
+    labelled = {}
+    for expert in EXPERTS:
+        part = dict(report.get(expert) or {"analyse": "RAS", "flag": "🟢"})
+        analyse = str(part.get("analyse", "")).strip()
+        if analyse and not analyse.upper().startswith("RAS"):
+            part["analyse"] = "\n".join(f"[{label}] {line}" for line in analyse.splitlines() if line.strip())
+        part["pages"] = []
+        labelled[expert] = part
+    return labelled
+
+
+# --- PIPELINE DU DOSSIER ---
+def _sub_ctx(ctx, doc):
+    """Contexte d'une pièce : réglages du dossier, trace partagée."""
+    return {
+        "pdf_bytes": doc.pdf_bytes, "use_cache": ctx.get("use_cache", True), "session_id": ctx.get("session_id"),
+        "trace": ctx.get("trace"), "cancel_event": ctx.get("cancel_event"), "document": doc,
+        "build_index": ctx.get("build_index"), "source": doc.name,
+    }
+
+
+def _map_documents(fn, items):
+    """`fn` sur chaque pièce, en parallèle (ordre conservé) ; les appels modèle restent bornés par l'ordonnanceur."""
+    with ThreadPoolExecutor(max_workers=max(1, min(TRINITE_WORKERS, len(items)))) as pool:
+        return list(pool.map(fn, items))
+
+
+def stage_sort(ctx):
+    """Evena : tri des pièces, puis lecture des seules pièces utiles (petites pièces extraites en parallèle).
+
+    Une pièce illisible (PDF corrompu) est mise de côté avec sa raison ; le dossier n'échoue
+    que si aucune pièce n'a pu être lue.
+    """
+    documents = classify_documents(ctx["files"])
+    selected = [doc for doc in documents if doc.kind in ROUTES]
+    skipped = [doc for doc in documents if doc.kind not in ROUTES]
+    if not selected:
+        raise ValueError(f"Aucune pièce à analyser dans le dossier ({len(skipped)} pièce(s) écartée(s) : plans, bordereaux...)")
+    t0 = time.perf_counter()
+    # Dossier entièrement en cache : à établir avant prefetch, qui remplit le cache
+    cache_hit = all(pdf_sha256(doc.pdf_bytes) in extract_cache for doc in selected)
+    prefetched = prefetch([doc.pdf_bytes for doc in selected])
+
+    def read(doc):
+        check_cancelled(ctx.get("cancel_event"))
+        sub = _sub_ctx(ctx, doc)
+        try:
+            sub.update(stage_evena(sub))
+        except ValueError as e:
+            return Unreadable(doc, str(e))
+        return sub
+
+    results = _map_documents(read, selected)
+    subs = [r for r in results if not isinstance(r, Unreadable)]
+    unreadable = [r for r in results if isinstance(r, Unreadable)]
+    if not subs:
+        raise ValueError("Aucune pièce lisible dans le dossier : " + " ; ".join(describe_unreadable(item) for item in unreadable))
+    elapsed = time.perf_counter() - t0
+    index = None
+    if ctx.get("build_index"):
+        # Index de chaque pièce construit pendant sa lecture (passages étiquetés), réunis pour le chat
+        index = DceIndex()
+        for sub in subs:
+            index.merge(sub["dce_index"])
+    stats = {key: sum(sub["dce_stats"][key] for sub in subs) for key in ("pages", "chars", "errors")}
+    trace = ctx.get("trace")
+    if trace is not None:
+        # Annotations du dossier entier (remplacent celles de la dernière pièce lue)
+        trace.annotate(
+            documents=len(documents), documents_read=len(subs), documents_prefetched=prefetched, documents_unreadable=len(unreadable),
+            pages=stats["pages"], chars=stats["chars"], page_errors=stats["errors"],
+            pages_per_s=round(stats["pages"] / elapsed, 1) if elapsed else None,
+            extract_cache_hit=cache_hit,
+        )
+    return {"documents": subs, "skipped": skipped, "unreadable": unreadable, "dce_index": index, "dce_stats": stats}
+
+
+def stage_secure(ctx):
+    """Kérès : une pièce sans texte (scan) est écartée ; pré-scan des marques sur les CCTP."""
+    kept, unreadable = [], list(ctx["unreadable"])
+    for sub in ctx["documents"]:
+        if not sub["dce_stats"]["chars"]:
+            unreadable.append(Unreadable(sub["document"], "aucun texte (scan ?)"))
+            continue
+        sub.update(stage_keres(sub) if ROUTES[sub["document"].kind] == "marques" else {"prescan": None})
+        kept.append(sub)
+    if not kept:
+        raise ValueError("Aucun texte exploitable dans les pièces du dossier (documents scannés ?)")
+    if ctx.get("trace") is not None:
+        ctx["trace"].annotate(documents_unreadable=len(unreadable))
+    return {"documents": kept, "unreadable": unreadable}
+
+
+def stage_route(ctx):
+    """Trinité : chaque pièce selon son type, en parallèle, puis fusion des rapports étiquetés."""
+    def analyse(sub):
+        check_cancelled(ctx.get("cancel_event"))
+        if ROUTES[sub["document"].kind] == "marques":
+            return stage_trinite(sub)
+        res, n_chunks, n_reused = analyse_segments(sub, sub["dce_pages"], P_TRINITE_CCAP, "Trinité CCAP")
+        return {"trinity_res": res, "trinity_chunks": n_chunks, "trinity_reused": n_reused}
+
+    for sub, out in zip(ctx["documents"], _map_documents(analyse, ctx["documents"])):
+        sub.update(out)
+    merged = merge_reports([label_report(sub["trinity_res"], sub["document"].name) for sub in ctx["documents"]])
+    n_chunks = sum(sub.get("trinity_chunks", 1) for sub in ctx["documents"])
+    n_reused = sum(sub.get("trinity_reused", 0) for sub in ctx["documents"])
+    if ctx.get("trace") is not None:
+        ctx["trace"].annotate(chunks=n_chunks, chunks_reused=n_reused)
+    return {"trinity_res": merged, "trinity_chunks": n_chunks, "trinity_reused": n_reused}
+
+
+def stage_synthesis(ctx):
+    """Phoebe : rapport fusionné + inventaire du dossier (pièces analysées, flags par pièce, pièces écartées)."""
+    analysed = [f"- {describe(sub['document'])} : {' '.join(trinity_flags(sub['trinity_res']).values())}" for sub in ctx["documents"]]
+    ignored = [f"- {describe(doc)}" for doc in ctx["skipped"]] + [f"- {describe_unreadable(item)}" for item in ctx["unreadable"]]
+    lines = [phoebe_processing(ctx["trinity_res"]), "Pièces analysées (Juridique Risques Data) :", *analysed]
+    if ignored:
+        lines += ["Pièces non analysées :", *ignored]
+    return {"phoebe_res": "\n".join(lines)}
+
+
+# Mêmes clés d'étape que COUNCIL_STAGES : l'app affiche les deux pipelines de la même façon
+PACKAGE_STAGES = [
+    Stage("evena", "Evena", "Evena : Tri et lecture du dossier...", stage_sort, ["files"], ["documents", "skipped", "unreadable", "dce_index", "dce_stats"], min_seconds=11),
+    Stage("keres", "Kérès", "Kérès : Sécurisation...", stage_secure, ["documents", "unreadable"], ["documents", "unreadable"], min_seconds=13),
+    Stage("trinite", "Trinité", "Trinité : Analyse des pièces...", stage_route, ["documents"], ["trinity_res"], min_seconds=30),
+    Stage("phoebe", "Phoebe", "Phoebe : Synthèse...", stage_synthesis, ["trinity_res", "documents"], ["phoebe_res"], min_seconds=8),
+    Stage("avenor", "Avenor", "Avenor : Verdict...", stage_avenor, ["phoebe_res"], ["avenor_res"]),
+]
+
+
+def run_package(files, use_cache=True, pacing=False, on_stage_start=None, on_stage_end=None, status_placeholder=None, on_avenor_token=None, session_id=None, cancel_event=None, build_index=False):
+    """Council sur un dossier multi-pièces ([(nom, bytes)], ZIP déjà dépliés : voir expand_uploads).
+
+    Même contexte de sortie que engine.run_council, plus ctx["documents"] (une
+    entrée par pièce analysée, avec son rapport), ctx["skipped"] (Document) et ctx["unreadable"]
+    (Unreadable : pièce et raison).
+    Pas d'historique de versions pour un dossier (ctx["revision"] est None) ; les
+    segments déjà analysés restent repris du cache modèle.
+    """
+    trace = RunTrace()
+    ctx = {"files": files, "status_placeholder": status_placeholder, "use_cache": use_cache, "on_avenor_token": on_avenor_token, "session_id": session_id, "trace": trace, "cancel_event": cancel_event, "build_index": build_index}
+    try:
+        run_pipeline(PACKAGE_STAGES, ctx, on_stage_start=on_stage_start, on_stage_end=on_stage_end, pacing=pacing, cancel_event=cancel_event)
+    except Cancelled:
+        trace.finish("cancelled")
+        raise
+    except Exception as e:
+        trace.finish("error", str(e))
+        raise
+    ctx["revision"] = None
+    trace.finish("ok")
+    return ctx
@@ -0,0 +1,81 @@
+"""Pipeline du Council : enchaînement d'étapes réelles et chronométrées."""
+import time
+
+
+class Cancelled(Exception):
+    """Analyse annulée (vérifiée entre les étapes et par les étapes longues)."""
+
+
+def check_cancelled(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise Cancelled("Analyse annulée")
+
+
+class Stage:
+    """Une étape du Council : callable ctx -> dict de sorties.
+
+    `inputs` sont les clés lues dans le contexte, `outputs` celles ajoutées.
+    `min_seconds` ne sert qu'en mode démo (rythme de présentation).
+    """
+
+    def __init__(self, key, name, label, fn, inputs=(), outputs=(), min_seconds=0):
+        self.key = key
+        self.name = name
+        self.label = label
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.min_seconds = min_seconds
+
+    def __repr__(self):
+        return f"Stage({self.key!r})"
+
+
+def run_pipeline(stages, ctx, on_stage_start=None, on_stage_end=None, pacing=False, cancel_event=None):
+    """Exécute les étapes dans l'ordre et renvoie le contexte enrichi.
+
+    Les durées mesurées (travail réel, hors rythme démo) sont dans ctx["timings"],
+    et dans ctx["trace"] (metrics.RunTrace) s'il est fourni.
+    Callbacks : on_stage_start(index, stage) et on_stage_end(index, stage, duree, ctx).
+    `cancel_event` (threading.Event) interrompt le pipeline avant l'étape suivante.
+    """
+    timings = ctx.setdefault("timings", {})
+    trace = ctx.get("trace")
+    for index, stage in enumerate(stages):
+        missing = [k for k in stage.inputs if k not in ctx]
+        if missing:
+            raise KeyError(f"{stage.name} : entrées manquantes {missing}")
+        check_cancelled(cancel_event)
+
+        if on_stage_start:
+            on_stage_start(index, stage)
+
+        if trace is not None:
+            trace.start_stage(stage.key)
+        t0 = time.perf_counter()
+        outputs = stage.fn(ctx) or {}
+        elapsed = time.perf_counter() - t0
+
+        absent = [k for k in stage.outputs if k not in outputs]
+        if absent:
+            raise KeyError(f"{stage.name} : sorties manquantes {absent}")
+        ctx.update(outputs)
+        timings[stage.key] = elapsed
+        if trace is not None:
+            trace.end_stage(stage.key, elapsed)
+
+        # Mode démo : on complète jusqu'au temps minimum, sans le compter comme travail
+        if pacing and elapsed < stage.min_seconds:
+            if cancel_event is not None:
+                cancel_event.wait(stage.min_seconds - elapsed)
+            else:
+                time.sleep(stage.min_seconds - elapsed)
+
+        if on_stage_end:
+            on_stage_end(index, stage, elapsed, ctx)
+    return ctx
+
+
+def progress_after(index, stages):
+    """Pourcentage d'avancement une fois l'étape `index` terminée."""
+    return int(100 * (index + 1) / len(stages))
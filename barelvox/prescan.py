@@ -0,0 +1,159 @@
+"""Kérès : pré-scan local des marques citées dans le DCE.
+
+Le contrôle cœur de la Trinité est lexical (marque citée sans "ou équivalent"
+dans le même paragraphe). On indexe donc localement les paragraphes qui citent
+une marque du référentiel, et seuls ceux-là partent au modèle.
+
+Le référentiel est compilé en une seule regex factorisée en trie : un passage
+linéaire par paragraphe, exécuté par le moteur C de `re`.
+"""
+import os
+import re
+import unicodedata
+from collections import namedtuple
+
+from barelvox.extraction import PageRecord
+
+# Désactivable (BAREL_PRESCAN=0) pour renvoyer tout le DCE à la Trinité
+PRESCAN_ENABLED = os.environ.get("BAREL_PRESCAN", "1") != "0"
+# Référentiel personnalisé : un nom de marque par ligne, "#" pour commenter
+BRANDS_FILE = os.environ.get("BAREL_BRANDS_FILE", "")
+
+DEFAULT_BRANDS = [
+    # Électricité / éclairage
+    "Legrand", "Schneider Electric", "Schneider", "Hager", "ABB", "Siemens", "Somfy",
+    "Philips", "Osram", "Zumtobel", "Thorn", "Trilux", "Sylvania", "Arnould", "Niko",
+    # CVC / plomberie
+    "Atlantic", "Daikin", "Viessmann", "De Dietrich", "Saunier Duval", "Thermor", "Acova",
+    "Finimetal", "Aldes", "France Air", "Zehnder", "Grundfos", "Wilo", "Danfoss",
+    "Grohe", "Hansgrohe", "Jacob Delafon", "Porcher", "Geberit", "Roca",
+    "Villeroy & Boch", "Delabie", "Presto", "Franke",
+    # Gros œuvre / second œuvre
+    "Knauf", "Placo", "Placoplatre", "Weber", "Sika", "Parex", "Lafarge", "Vicat",
+    "Rockwool", "Isover", "Ursa", "Siporex", "Ytong", "Wienerberger", "Monier",
+    "Rector", "KP1", "Soprema", "Siplast",
+    # Menuiseries / quincaillerie
+    "Velux", "Technal", "Schüco", "Kawneer", "Reynaers", "K-Line", "Bricard",
+    "Vachette", "Fichet", "Dorma", "Assa Abloy", "Hörmann",
+    # Revêtements / plafonds
+    "Tarkett", "Gerflor", "Forbo", "Armstrong", "Ecophon", "Saint-Gobain",
+]
+
+Candidate = namedtuple("Candidate", ["page", "paragraph", "brands", "has_equivalent", "text"])
+
+# "ou équivalent", "ou techniquement équivalent", "ou produit équivalent", ...
+EQUIVALENT_RE = re.compile(r"\bou\s+(?:[a-z-]+\s+){0,2}equivalente?s?\b")
+
+
+def normalize(text):
+    """Minuscules, sans accents, espaces compactés (même forme pour texte et marques)."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", text)
+
+
+def load_brands(path=BRANDS_FILE):
+    if not path:
+        return list(DEFAULT_BRANDS)
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+def _trie_pattern(node):
+    """Regex d'un sous-trie : les préfixes communs ne sont testés qu'une fois."""
+    end = "" in node
+    branches = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch != ""]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if end:
+        return f"(?:{body})?"
+    return body
+
+
+class BrandMatcher:
+    """Matcher multi-motifs compilé une fois pour tout le référentiel."""
+
+    def __init__(self, brands):
+        self.canonical = {}
+        trie = {}
+        for brand in brands:
+            key = normalize(brand).strip()
+            if not key or key in self.canonical:
+                continue
+            self.canonical[key] = brand
+            node = trie
+            for ch in key:
+                node = node.setdefault(ch, {})
+            node[""] = True
+        pattern = _trie_pattern(trie) if trie else "(?!)"
+        self._regex = re.compile(rf"(?<!\w)(?:{pattern})(?!\w)")
+
+    def find(self, normalized_text):
+        """Marques (forme canonique, sans doublon) trouvées dans un texte déjà normalisé."""
+        found = []
+        for match in self._regex.finditer(normalized_text):
+            brand = self.canonical[match.group()]
+            if brand not in found:
+                found.append(brand)
+        return found
+
+
+_default_matcher = None
+
+def default_matcher():
+    global _default_matcher
+    if _default_matcher is None:
+        _default_matcher = BrandMatcher(load_brands())
+    return _default_matcher
+
+
+class PrescanResult:
+    """Index des paragraphes candidats du DCE, par page."""
+
+    def __init__(self, candidates, n_pages, n_paragraphs):
+        self.candidates = candidates
+        self.n_pages = n_pages
+        self.n_paragraphs = n_paragraphs
+
+    @property
+    def without_equivalent(self):
+        return [c for c in self.candidates if not c.has_equivalent]
+
+    def pages(self):
+        """Candidats regroupés en PageRecord, pour le découpage Trinité ([Page N] conservé)."""
+        records, offset = [], 0
+        by_page = {}
+        for c in self.candidates:
+            by_page.setdefault(c.page, []).append(c.text)
+        for page in sorted(by_page):
+            text = "\n\n".join(by_page[page])
+            records.append(PageRecord(page, text, offset, offset + len(text)))
+            offset += len(text) + 2
+        return records
+
+    def deterministic_report(self):
+        """Rapport Trinité sans appel modèle, quand aucun paragraphe n'est candidat."""
+        return {
+            "liorah": {"analyse": f"RAS - Aucune marque du référentiel citée ({self.n_pages} pages pré-scannées).", "flag": "🟢", "pages": []},
+            "ethan": {"analyse": "RAS - Aucun paragraphe à risque détecté au pré-scan.", "flag": "🟢", "pages": []},
+            "krypt": {"analyse": f"RAS - {self.n_paragraphs} paragraphes indexés, 0 candidat.", "flag": "🟢", "pages": []},
+        }
+
+
+def prescan(pages, matcher=None):
+    """Indexe chaque paragraphe citant une marque, avec la présence d'une clause d'équivalence."""
+    matcher = matcher or default_matcher()
+    candidates = []
+    n_pages = n_paragraphs = 0
+    for page in pages:
+        n_pages += 1
+        for index, paragraph in enumerate(page.text.split("\n\n")):
+            if not paragraph.strip():
+                continue
+            n_paragraphs += 1
+            norm = normalize(paragraph)
+            brands = matcher.find(norm)
+            if brands:
+                candidates.append(Candidate(page.page, index, brands, bool(EQUIVALENT_RE.search(norm)), paragraph.strip()))
+    return PrescanResult(candidates, n_pages, n_paragraphs)
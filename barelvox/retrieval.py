@@ -0,0 +1,133 @@
+"""Index BM25 du DCE pour le chat : les questions partent avec quelques passages, pas le dossier.
+
+Construit une fois pendant la lecture (Evena), en mémoire : index inversé
+terme -> (passage, fréquence), passages = paragraphes avec leur page.
+La taille du prompt de chat reste bornée (BAREL_CHAT_CONTEXT_CHARS) quelle
+que soit la taille du DCE.
+"""
+import heapq
+import math
+import os
+import re
+import unicodedata
+from collections import Counter, namedtuple
+
+CHAT_TOP_K = int(os.environ.get("BAREL_CHAT_TOP_K", "6"))
+CHAT_CONTEXT_CHARS = int(os.environ.get("BAREL_CHAT_CONTEXT_CHARS", "6000"))
+# Paragraphes plus longs découpés en fenêtres de cette taille
+PASSAGE_CHARS = 1200
+MIN_PASSAGE_CHARS = 80
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = frozenset("""
+a au aux avec ce ces cette dans de des du elle en est et etre il ils la le les leur lui mais
+me meme ne ni nous on ou par pas pour qu que qui sa se ses son sont sur ta te tes toi ton tu un une
+vos votre vous y l d s n c j m t quel quelle quels quelles
+""".split())
+
+_LIGATURES = str.maketrans({"œ": "oe", "æ": "ae"})
+# Numéros d'article gardés entiers (4.2.1), mots sinon
+_TOKEN_RE = re.compile(r"\d+(?:\.\d+)*|[a-z]+")
+
+# source : pièce du dossier (dossier multi-fichiers), None pour un PDF seul
+Passage = namedtuple("Passage", ["page", "text", "source"], defaults=(None,))
+
+
+def tokenize(text):
+    """Termes indexés : minuscules sans accents, sans mots vides."""
+    text = unicodedata.normalize("NFKD", text.casefold().translate(_LIGATURES))
+    text = text.encode("ascii", "ignore").decode("ascii")
+    return [t for t in _TOKEN_RE.findall(text) if t not in STOPWORDS]
+
+
+def _passages(page, source=None):
+    """Paragraphes de la page ; un paragraphe court (titre d'article) est rattaché au suivant."""
+    pending = ""
+    for paragraph in page.text.split("\n\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if pending:
+            paragraph = f"{pending} {paragraph}"
+        if len(paragraph) < MIN_PASSAGE_CHARS:
+            pending = paragraph
+            continue
+        pending = ""
+        for start in range(0, len(paragraph), PASSAGE_CHARS):
+            yield Passage(page.page, paragraph[start:start + PASSAGE_CHARS], source)
+    if pending:
+        yield Passage(page.page, pending, source)
+
+
+class DceIndex:
+    """BM25 sur les passages d'un dossier. `add_page` au fil de l'extraction, puis `search`."""
+
+    def __init__(self):
+        self.passages = []
+        self.lengths = []
+        self.postings = {}  # terme -> [(n° passage, tf)]
+        self.total_length = 0
+
+    def add_page(self, page, source=None):
+        for passage in _passages(page, source):
+            terms = tokenize(passage.text)
+            if not terms:
+                continue
+            doc_id = len(self.passages)
+            self.passages.append(passage)
+            self.lengths.append(len(terms))
+            self.total_length += len(terms)
+            for term, tf in Counter(terms).items():
+                self.postings.setdefault(term, []).append((doc_id, tf))
+
+    def merge(self, other):
+        """Ajoute les passages d'un autre index (dossier multi-pièces : un index par pièce)."""
+        offset = len(self.passages)
+        self.passages.extend(other.passages)
+        self.lengths.extend(other.lengths)
+        self.total_length += other.total_length
+        for term, postings in other.postings.items():
+            self.postings.setdefault(term, []).extend((doc_id + offset, tf) for doc_id, tf in postings)
+
+    def __len__(self):
+        return len(self.passages)
+
+    def search(self, query, k=CHAT_TOP_K):
+        """Les `k` meilleurs passages pour la question : [(score, Passage)], score décroissant."""
+        n = len(self.passages)
+        if not n:
+            return []
+        avg_length = self.total_length / n
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(score, self.passages[doc_id]) for doc_id, score in best]
+
+    def context(self, query, k=CHAT_TOP_K, max_chars=CHAT_CONTEXT_CHARS):
+        """Passages pertinents formatés "[Page N] ..." ("[pièce] [Page N] ..." pour un dossier
+        multi-fichiers), dans l'ordre du document, bornés à `max_chars`."""
+        selected, size = [], 0
+        for _, passage in self.search(query, k):
+            block = f"[Page {passage.page}] {passage.text}"
+            if passage.source:
+                block = f"[{passage.source}] {block}"
+            if size + len(block) > max_chars:
+                break
+            selected.append(((passage.source or "", passage.page), block))
+            size += len(block) + 2
+        return "\n\n".join(block for _, block in sorted(selected, key=lambda item: item[0]))
+
+
+def build_index(pages):
+    index = DceIndex()
+    for page in pages:
+        index.add_page(page)
+    return index
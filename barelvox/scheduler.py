@@ -0,0 +1,130 @@
+"""Ordonnanceur partagé des appels modèle : quotas, file équitable, reprises adaptatives.
+
+Tous les appels du process passent par `scheduler.slot()` :
+- token buckets sur les requêtes et les tokens par minute (quota Gemini) ;
+- au plus `max_inflight` appels simultanés ;
+- file round-robin par session : une analyse de 40 segments ne bloque pas la
+  question de chat d'une autre session.
+Les erreurs sont classées (quota, timeout, JSON invalide) pour choisir la reprise.
+"""
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+RPM_LIMIT = int(os.environ.get("BAREL_RPM", "60"))
+TPM_LIMIT = int(os.environ.get("BAREL_TPM", "1000000"))
+MAX_INFLIGHT = int(os.environ.get("BAREL_MAX_INFLIGHT", "8"))
+
+# Tentatives max et délai de base (s) par type d'erreur
+RETRY_POLICY = {
+    "rate_limit": (5, 2.0),
+    "timeout": (3, 1.0),
+    "bad_json": (2, 0.0),
+    "other": (2, 1.0),
+}
+MAX_BACKOFF = 30.0
+
+
+class BadJSONError(ValueError):
+    """Réponse reçue mais JSON inexploitable : on régénère sans attendre."""
+
+
+def classify_error(exc):
+    if isinstance(exc, BadJSONError):
+        return "bad_json"
+    name = type(exc).__name__
+    text = str(exc).lower()
+    if name in ("ResourceExhausted", "TooManyRequests") or "429" in text or "quota" in text or "rate limit" in text:
+        return "rate_limit"
+    if isinstance(exc, TimeoutError) or name in ("DeadlineExceeded", "ServiceUnavailable") or "timeout" in text or "deadline" in text:
+        return "timeout"
+    return "other"
+
+
+def backoff_delay(kind, attempt):
+    """Backoff exponentiel avec jitter complet (attempt commence à 1)."""
+    base = RETRY_POLICY[kind][1]
+    if base <= 0:
+        return 0.0
+    return random.uniform(0, min(MAX_BACKOFF, base * 2 ** (attempt - 1)))
+
+
+class TokenBucket:
+    """Seau à jetons par minute. reserve() réserve tout de suite et renvoie l'attente à faire."""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Une demande plus grosse que le seau passe seule, une fois le seau plein
+            self.tokens -= min(amount, self.capacity)
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class Scheduler:
+    def __init__(self, rpm=RPM_LIMIT, tpm=TPM_LIMIT, max_inflight=MAX_INFLIGHT):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_inflight = max(1, max_inflight)
+        self._cond = threading.Condition()
+        self._queues = OrderedDict()  # session -> tickets en attente, dans l'ordre de passage
+        self._inflight = 0
+        self.counters = {"calls": 0, "retries": 0, "failures": 0, "queue_wait": 0.0}
+
+    def _next_ticket(self):
+        for queue in self._queues.values():
+            return queue[0]
+        return None
+
+    @contextmanager
+    def slot(self, session_id=None, tokens=0):
+        """Attend son tour (équité par session, in-flight, quotas) ; renvoie l'attente subie (s)."""
+        t0 = time.monotonic()
+        ticket = object()
+        with self._cond:
+            self._queues.setdefault(session_id, deque()).append(ticket)
+            while self._inflight >= self.max_inflight or self._next_ticket() is not ticket:
+                self._cond.wait()
+            queue = self._queues.pop(session_id)
+            queue.popleft()
+            # Round-robin : la session servie repasse en fin de tour
+            if queue:
+                self._queues[session_id] = queue
+            self._inflight += 1
+            self._cond.notify_all()
+        try:
+            delay = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+            if delay:
+                time.sleep(delay)
+            waited = time.monotonic() - t0
+            with self._cond:
+                self.counters["calls"] += 1
+                self.counters["queue_wait"] += waited
+            yield waited
+        finally:
+            with self._cond:
+                self._inflight -= 1
+                self._cond.notify_all()
+
+    def record_retry(self, failed=False):
+        with self._cond:
+            self.counters["failures" if failed else "retries"] += 1
+
+    def stats(self):
+        with self._cond:
+            waiting = sum(len(q) for q in self._queues.values())
+            return dict(self.counters, inflight=self._inflight, waiting=waiting)
+
+
+scheduler = Scheduler()
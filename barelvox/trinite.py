@@ -0,0 +1,225 @@
+"""Trinité en map-reduce : découpage du DCE en segments, analyses concurrentes, fusion.
+
+Chaque segment porte ses numéros de page ([Page N]) pour que les citations
+du modèle restent exactes ; la fusion garde le pire flag par expert.
+
+Les frontières de segments dépendent du contenu (pas de la position) : après un
+addendum, les segments hors des pages modifiées sont identiques à ceux de la
+version précédente et leur résultat est réutilisé (empreinte `fingerprint`,
+indépendante des numéros de page).
+"""
+import hashlib
+import os
+import re
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Budget par segment (tokens estimés) et nombre d'appels modèle simultanés
+CHUNK_TOKENS = int(os.environ.get("BAREL_TRINITE_CHUNK_TOKENS", "24000"))
+TRINITE_WORKERS = int(os.environ.get("BAREL_TRINITE_WORKERS", "4"))
+
+EXPERTS = ("liorah", "ethan", "krypt")
+FLAG_RANK = {"🟢": 0, "🟠": 1, "🔴": 2}
+
+Chunk = namedtuple("Chunk", ["index", "pages", "text", "fingerprint"])
+
+# Sortie typée de la Trinité, passée au modèle comme response_schema (sous-ensemble OpenAPI de Gemini)
+EXPERT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "analyse": {"type": "STRING"},
+        "flag": {"type": "STRING", "format": "enum", "enum": list(FLAG_RANK)},
+        "pages": {"type": "ARRAY", "items": {"type": "INTEGER"}},
+    },
+    "required": ["analyse", "flag", "pages"],
+}
+TRINITE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {expert: EXPERT_SCHEMA for expert in EXPERTS},
+    "required": list(EXPERTS),
+}
+_PAGE_RE = re.compile(r"\[Page (\d+)\]")
+
+
+def estimate_tokens(text):
+    """Estimation grossière (~4 caractères par token), suffisante pour un budget."""
+    return len(text) // 4 + 1
+
+
+def _split_page(page, budget_chars):
+    """Coupe une page trop longue aux paragraphes, puis en dur si nécessaire."""
+    pieces, current = [], ""
+    for para in page.text.split("\n\n"):
+        while len(para) > budget_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(para[:budget_chars])
+            para = para[budget_chars:]
+        if current and len(current) + len(para) + 2 > budget_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current}\n\n{para}" if current else para
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _piece_hash(piece):
+    return int.from_bytes(hashlib.sha256(piece.encode("utf-8")).digest()[:8], "big")
+
+
+def iter_chunks(pages, budget_tokens=CHUNK_TOKENS):
+    """Regroupe un flux de PageRecord en segments d'au plus `budget_tokens` (estimés).
+
+    Découpage défini par le contenu : au-delà d'un quart du budget, on coupe après un
+    morceau de page avec une probabilité proportionnelle à sa taille, tirée de son hash
+    (segment moyen ~ moitié du budget). Une modification ne déplace que les frontières voisines.
+    """
+    budget_chars = budget_tokens * 4
+    min_chars, target_chars = budget_chars // 4, budget_chars // 2
+    index = 0
+    blocks, numbers, size = [], [], 0
+    digest = hashlib.sha256()
+
+    def make_chunk():
+        return Chunk(index, numbers, "".join(blocks), digest.hexdigest())
+
+    for page in pages:
+        for piece in _split_page(page, budget_chars):
+            block = f"[Page {page.page}]\n{piece}\n\n"
+            if blocks and size + len(block) > budget_chars:
+                yield make_chunk()
+                index += 1
+                blocks, numbers, size = [], [], 0
+                digest = hashlib.sha256()
+            blocks.append(block)
+            if not numbers or numbers[-1] != page.page:
+                numbers.append(page.page)
+            size += len(block)
+            # Empreinte : contenu + rang de la page dans le segment, pas son numéro
+            digest.update(f"{len(numbers)}\x00{piece}\x00".encode("utf-8"))
+            if size >= min_chars and _piece_hash(piece) % target_chars < len(piece):
+                yield make_chunk()
+                index += 1
+                blocks, numbers, size = [], [], 0
+                digest = hashlib.sha256()
+    if blocks:
+        yield make_chunk()
+
+
+def renumber_report(report, old_pages, new_pages):
+    """Rapport d'un segment réutilisé : citations renumérotées (pages de l'ancienne version -> nouvelle)."""
+    mapping = dict(zip(old_pages, new_pages))
+    if all(old == new for old, new in mapping.items()):
+        return report
+
+    def page_label(match):
+        return f"[Page {mapping.get(int(match.group(1)), match.group(1))}]"
+
+    renumbered = {}
+    for expert, part in report.items():
+        if isinstance(part, dict):
+            part = dict(part)
+            part["analyse"] = _PAGE_RE.sub(page_label, str(part.get("analyse", "")))
+            part["pages"] = sorted(mapping.get(p, p) for p in part.get("pages", []))
+        renumbered[expert] = part
+    return renumbered
+
+
+def _is_ras(analyse):
+    return analyse.strip().upper().startswith("RAS")
+
+
+def _pages(value, analyse):
+    """Pages citées : liste fournie (entiers ou chaînes numériques), sinon les [Page N] de l'analyse."""
+    pages = set()
+    if isinstance(value, list):
+        for item in value:
+            if isinstance(item, int) or (isinstance(item, str) and item.strip().isdigit()):
+                pages.add(int(item))
+    if not pages:
+        pages = {int(n) for n in _PAGE_RE.findall(analyse)}
+    return sorted(pages)
+
+
+def validate_report(data):
+    """Rapport conforme à TRINITE_SCHEMA, ou None si aucun expert n'est exploitable.
+
+    Champs manquants complétés sans rappeler le modèle : flag déduit de l'analyse
+    (RAS -> 🟢, sinon 🟠), pages tirées des [Page N]. Un expert absent (réponse
+    tronquée) est marqué 🟠 "non évalué" plutôt que supposé RAS.
+    """
+    if not isinstance(data, dict):
+        return None
+    report = {}
+    for expert in EXPERTS:
+        part = data.get(expert)
+        if isinstance(part, str):
+            part = {"analyse": part}
+        if not isinstance(part, dict):
+            continue
+        analyse = str(part.get("analyse") or "").strip()
+        flag = part.get("flag")
+        if flag not in FLAG_RANK:
+            flag = "🟢" if not analyse or _is_ras(analyse) else "🟠"
+        report[expert] = {"analyse": analyse or "RAS", "flag": flag, "pages": _pages(part.get("pages"), analyse)}
+    if not report:
+        return None
+    for expert in EXPERTS:
+        report.setdefault(expert, {"analyse": "Non évalué (réponse incomplète).", "flag": "🟠", "pages": []})
+    return report
+
+
+def merge_reports(reports):
+    """Fusionne des rapports Trinité partiels : pire flag par expert, constats conservés.
+
+    Les analyses "RAS" ne sont gardées que si aucun segment n'a rien relevé ;
+    les autres sont concaténées (dédoublonnées) pour préserver chaque [Page X].
+    Les pages citées sont réunies.
+    """
+    merged = {}
+    for expert in EXPERTS:
+        flag, findings, ras, pages = "🟢", [], [], set()
+        for report in reports:
+            part = report.get(expert) if isinstance(report, dict) else None
+            if not isinstance(part, dict):
+                continue
+            part_flag = part.get("flag", "🟢")
+            if FLAG_RANK.get(part_flag, 1) > FLAG_RANK.get(flag, 1):
+                flag = part_flag
+            pages.update(_pages(part.get("pages"), ""))
+            analyse = str(part.get("analyse", "")).strip()
+            if not analyse:
+                continue
+            target = ras if _is_ras(analyse) else findings
+            if analyse not in target:
+                target.append(analyse)
+        if findings:
+            analyse = "\n".join(findings)
+        else:
+            analyse = ras[0] if ras else "RAS"
+        merged[expert] = {"analyse": analyse, "flag": flag, "pages": sorted(pages)}
+    return merged
+
+
+def run_mapreduce(analyse_chunk, chunks, max_workers=TRINITE_WORKERS):
+    """Analyse les segments en parallèle (au plus `max_workers` en vol) et fusionne.
+
+    `analyse_chunk(chunk)` renvoie un rapport Trinité (dict). Les segments sont
+    consommés au fil de l'eau : seuls ceux en cours d'analyse sont en mémoire.
+    Renvoie (rapport fusionné, nombre de segments).
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        pending = {}
+        for chunk in chunks:
+            if len(pending) >= max_workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+            pending[pool.submit(analyse_chunk, chunk)] = chunk.index
+        for future in pending:
+            results[pending[future]] = future.result()
+    reports = [results[i] for i in sorted(results)]
+    return merge_reports(reports), len(reports)
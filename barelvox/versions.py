@@ -0,0 +1,175 @@
+"""Versions successives d'un DCE : empreinte de chaque page, flags et verdict par analyse.
+
+Un PDF révisé (addendum, réédition) est rapproché de la version déjà analysée
+qui partage le plus de pages avec lui, sans se fier au nom du fichier.
+On en tire la liste des pages modifiées / ajoutées / supprimées et les flags
+qui ont changé. Les résultats Trinité par segment sont, eux, dans le cache
+modèle (voir trinite.iter_chunks).
+"""
+import difflib
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import namedtuple
+
+from barelvox.extraction import CACHE_DIR
+
+VERSIONS_ENABLED = os.environ.get("BAREL_VERSIONS", "1") != "0"
+# Part minimale de pages communes pour considérer deux PDF comme deux versions du même DCE
+MIN_SHARED_PAGES = float(os.environ.get("BAREL_VERSIONS_MIN_SHARED", "0.5"))
+# Historique borné comme les autres caches : durée de vie et nombre de versions gardées
+VERSIONS_TTL = int(os.environ.get("BAREL_VERSIONS_TTL", str(180 * 24 * 3600)))
+VERSIONS_MAX = int(os.environ.get("BAREL_VERSIONS_MAX", "2000"))
+# Taille des lots de paramètres SQL (limite SQLITE_MAX_VARIABLE_NUMBER des vieilles versions)
+_SQL_BATCH = 500
+
+PageDiff = namedtuple("PageDiff", ["changed", "added", "removed", "unchanged"])
+
+
+def page_hash(text):
+    """Empreinte d'une page, insensible aux espaces (numéro de page non compris)."""
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()[:16]
+
+
+def diff_pages(old, new):
+    """Compare deux listes [(n° page, empreinte)] dans l'ordre du document.
+
+    changed/added : numéros dans la nouvelle version ; removed : dans l'ancienne.
+    """
+    matcher = difflib.SequenceMatcher(None, [h for _, h in old], [h for _, h in new], autojunk=False)
+    changed, added, removed, unchanged = [], [], [], 0
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == "equal":
+            unchanged += i2 - i1
+        elif op == "replace":
+            # Pages remplacées une pour une ; le surplus d'un côté est ajouté / supprimé
+            n = min(i2 - i1, j2 - j1)
+            changed += [page for page, _ in new[j1:j1 + n]]
+            added += [page for page, _ in new[j1 + n:j2]]
+            removed += [page for page, _ in old[i1 + n:i2]]
+        elif op == "insert":
+            added += [page for page, _ in new[j1:j2]]
+        elif op == "delete":
+            removed += [page for page, _ in old[i1:i2]]
+    return PageDiff(changed, added, removed, unchanged)
+
+
+class VersionStore:
+    """Versions analysées (SQLite) : une ligne par PDF, plus l'index empreinte de page -> PDF.
+
+    `created` est la date de première analyse d'un PDF : une nouvelle analyse ne la
+    rafraîchit pas, elle ordonne les versions. Éviction au-delà de `ttl` et de `max_versions`
+    (les plus anciennes d'abord), avec leurs empreintes de pages.
+    """
+
+    def __init__(self, path, ttl=VERSIONS_TTL, max_versions=VERSIONS_MAX):
+        self.path = path
+        self.ttl = ttl
+        self.max_versions = max_versions
+
+    def _connect(self):
+        # Schéma vérifié à chaque connexion : un .cache vidé pendant que l'app tourne est recréé
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS versions ("
+            " sha256 TEXT PRIMARY KEY, name TEXT, created REAL NOT NULL,"
+            " pages TEXT NOT NULL, flags TEXT NOT NULL, verdict_flag TEXT NOT NULL)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS version_pages (page_hash TEXT NOT NULL, sha256 TEXT NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS version_pages_hash ON version_pages (page_hash)")
+        conn.execute("CREATE INDEX IF NOT EXISTS version_pages_sha256 ON version_pages (sha256)")
+        return conn
+
+    def find_previous(self, sha256, pages):
+        """Version antérieure la plus proche de `pages` ([(n°, empreinte)]), ou None.
+
+        Seules les versions analysées avant ce PDF comptent (un ancien PDF redéposé
+        ne se compare pas à une version plus récente) ; à égalité, la plus récente.
+        """
+        hashes = sorted({h for _, h in pages})
+        if not hashes:
+            return None
+        shared, created = {}, {}
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT created FROM versions WHERE sha256 = ?", (sha256,)).fetchone()
+            before = row[0] if row else float("inf")
+            for start in range(0, len(hashes), _SQL_BATCH):
+                batch = hashes[start:start + _SQL_BATCH]
+                rows = conn.execute(
+                    f"SELECT p.sha256, COUNT(DISTINCT p.page_hash), v.created FROM version_pages p"
+                    f" JOIN versions v ON v.sha256 = p.sha256"
+                    f" WHERE p.page_hash IN ({','.join('?' * len(batch))}) AND p.sha256 != ? AND v.created < ?"
+                    f" GROUP BY p.sha256",
+                    (*batch, sha256, before),
+                ).fetchall()
+                for other, count, other_created in rows:
+                    shared[other] = shared.get(other, 0) + count
+                    created[other] = other_created
+            best = max(shared.items(), key=lambda item: (item[1], created[item[0]]), default=None)
+            if best is None or best[1] < MIN_SHARED_PAGES * len(hashes):
+                conn.close()
+                return None
+            row = conn.execute("SELECT sha256, name, created, pages, flags, verdict_flag FROM versions WHERE sha256 = ?", (best[0],)).fetchone()
+            conn.close()
+        except sqlite3.Error:
+            return None
+        if not row:
+            return None
+        return {"sha256": row[0], "name": row[1], "created": row[2], "pages": json.loads(row[3]), "flags": json.loads(row[4]), "verdict_flag": row[5]}
+
+    def record(self, sha256, name, pages, flags, verdict_flag):
+        now = time.time()
+        try:
+            conn = self._connect()
+            with conn:
+                # Date de première analyse conservée (ordre des versions)
+                conn.execute(
+                    "INSERT INTO versions VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (sha256) DO UPDATE SET"
+                    " name = excluded.name, pages = excluded.pages, flags = excluded.flags, verdict_flag = excluded.verdict_flag",
+                    (sha256, name, now, json.dumps(pages), json.dumps(flags, ensure_ascii=False), verdict_flag),
+                )
+                conn.execute("DELETE FROM version_pages WHERE sha256 = ?", (sha256,))
+                conn.executemany("INSERT INTO version_pages VALUES (?, ?)", [(h, sha256) for h in {h for _, h in pages}])
+                self._evict(conn, now)
+            conn.close()
+        except sqlite3.Error:
+            # Historique best-effort : ne bloque jamais une analyse
+            pass
+
+    def _evict(self, conn, now):
+        expired = conn.execute("SELECT sha256 FROM versions WHERE created <= ?", (now - self.ttl,)).fetchall()
+        expired += conn.execute(
+            "SELECT sha256 FROM versions WHERE created > ? ORDER BY created DESC LIMIT -1 OFFSET ?",
+            (now - self.ttl, self.max_versions),
+        ).fetchall()
+        for (sha256,) in expired:
+            conn.execute("DELETE FROM version_pages WHERE sha256 = ?", (sha256,))
+            conn.execute("DELETE FROM versions WHERE sha256 = ?", (sha256,))
+
+
+version_store = VersionStore(os.path.join(CACHE_DIR, "versions.sqlite3"))
+
+
+def compare_versions(previous, pages, flags, verdict_flag):
+    """Résumé de révision : pages touchées et flags (experts + verdict) qui ont changé."""
+    diff = diff_pages(previous["pages"], pages)
+    flag_changes = {
+        expert: [previous["flags"].get(expert, "🟢"), flag]
+        for expert, flag in flags.items()
+        if previous["flags"].get(expert, "🟢") != flag
+    }
+    if previous["verdict_flag"] != verdict_flag:
+        flag_changes["verdict"] = [previous["verdict_flag"], verdict_flag]
+    return {
+        "previous": {"sha256": previous["sha256"], "name": previous["name"], "created": previous["created"]},
+        "changed": diff.changed,
+        "added": diff.added,
+        "removed": diff.removed,
+        "unchanged": diff.unchanged,
+        "flag_changes": flag_changes,
+    }
@@ -0,0 +1 @@
+"""Benchmarks des chemins critiques de BAREL VOX (extraction, parsing JSON, pipeline)."""
@@ -0,0 +1,193 @@
+"""Suite de benchmarks : extraction, clean_gemini_json, pipeline complet (backend stub).
+
+    python -m benchmarks.run -o bench.json                  # suite complète
+    python -m benchmarks.run --pages 10 100 -o quick.json   # tailles réduites
+    python -m benchmarks.run --compare avant.json apres.json
+
+Chaque cas tourne dans un processus neuf (RSS de crête propre, caches vides
+dans un dossier temporaire, cache modèle désactivé). Le résultat est un JSON
+{"meta": ..., "results": {cas: {métrique: valeur}}} comparable entre deux runs.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synth import make_cctp_pdf
+
+
+def _rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(who).ru_maxrss * scale / 1e6, 1)
+
+
+# --- CAS (exécutés dans le processus enfant) ---
+def case_extract(params):
+    from barelvox.extraction import extract_cache, iter_pages
+    with open(params["pdf"], "rb") as f:
+        pdf_bytes = f.read()
+    cache = extract_cache if params["cache"] != "off" else None
+    if params["cache"] == "warm":
+        for _ in iter_pages(pdf_bytes, cache=cache):
+            pass
+    rss_start = _rss_mb()
+    t0 = time.perf_counter()
+    n_pages = sum(1 for _ in iter_pages(pdf_bytes, cache=cache, workers=params["workers"]))
+    elapsed = time.perf_counter() - t0
+    return {
+        "seconds": round(elapsed, 4),
+        "pages": n_pages,
+        "pages_per_s": round(n_pages / elapsed, 1),
+        "rss_start_mb": rss_start,
+        "peak_rss_mb": _rss_mb(),
+        "workers_peak_rss_mb": _rss_mb(resource.RUSAGE_CHILDREN),
+    }
+
+
+def _json_payloads():
+    findings = [{"analyse": f"[Page {i}] Marque Legrand imposée sans équivalence (art. {i}.2).", "flag": "🟠"} for i in range(2000)]
+    report = {
+        "liorah": {"analyse": "\n".join(f["analyse"] for f in findings), "flag": "🟠"},
+        "ethan": {"analyse": "RAS - Normes DTU respectées.", "flag": "🟢"},
+        "krypt": {"analyse": "RAS", "flag": "🟢"},
+    }
+    valid = json.dumps(report, ensure_ascii=False)
+    return {
+        "large": valid,
+        "fenced_trailing": f"Voici le rapport :\n```json\n{valid}\n```\nN'hésitez pas si besoin {{détails}}.",
+        "list_wrapper": f"[{valid}]",
+        "truncated": valid[: len(valid) * 2 // 3],
+        "noise": "Analyse impossible. " * 5000,
+    }
+
+
+def case_clean_json(params):
+    from barelvox.engine import clean_gemini_json
+    results = {}
+    for name, payload in _json_payloads().items():
+        ok = isinstance(clean_gemini_json(payload), dict)
+        runs, t0 = 0, time.perf_counter()
+        while time.perf_counter() - t0 < params["seconds"]:
+            clean_gemini_json(payload)
+            runs += 1
+        elapsed = time.perf_counter() - t0
+        results[name] = {"bytes": len(payload.encode("utf-8")), "parsed": ok, "us_per_op": round(elapsed / runs * 1e6, 1), "ops_per_s": round(runs / elapsed, 1)}
+    return results
+
+
+def case_pipeline(params):
+    from barelvox.backends import StubBackend, set_backend
+    from barelvox.engine import run_council
+    set_backend(StubBackend(latency=params["latency"]))
+    with open(params["pdf"], "rb") as f:
+        pdf_bytes = f.read()
+    t0 = time.perf_counter()
+    ctx = run_council(pdf_bytes, use_cache=False)
+    elapsed = time.perf_counter() - t0
+    result = {"seconds": round(elapsed, 4), "pages": ctx["dce_stats"]["pages"], "pages_per_s": round(ctx["dce_stats"]["pages"] / elapsed, 1), "peak_rss_mb": _rss_mb()}
+    result.update({f"stage_{k}_s": round(v, 4) for k, v in ctx["timings"].items()})
+    return result
+
+
+CASES = {"extract": case_extract, "clean_json": case_clean_json, "pipeline": case_pipeline}
+
+
+# --- ORCHESTRATION ---
+def run_case(case, params, cache_dir):
+    env = dict(os.environ, BAREL_CACHE_DIR=cache_dir, BAREL_LLM_CACHE="0")
+    if params.get("workers"):
+        # Budget de processus à la taille demandée (il vaut cpu_count par défaut)
+        env["BAREL_EXTRACT_MAX_PROCESSES"] = str(params["workers"])
+    cmd = [sys.executable, "-m", "benchmarks.run", "--child", json.dumps({"case": case, "params": params})]
+    out = subprocess.run(cmd, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def run_suite(pages_list, brand_density, equivalent_ratio, workers, latency, log):
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="barelvox-bench-") as tmp:
+        for pages in pages_list:
+            pdf = os.path.join(tmp, f"cctp_{pages}p.pdf")
+            with open(pdf, "wb") as f:
+                f.write(make_cctp_pdf(pages, brand_density, equivalent_ratio))
+            variants = [("serial", 1, "off"), ("warm_cache", 1, "warm")]
+            if workers > 1:
+                variants.insert(1, (f"parallel_{workers}", workers, "off"))
+            for label, n_workers, cache in variants:
+                name = f"extract.{pages}p.{label}"
+                log(name)
+                cache_dir = tempfile.mkdtemp(dir=tmp)
+                results[name] = run_case("extract", {"pdf": pdf, "workers": n_workers, "cache": cache}, cache_dir)
+            name = f"pipeline.{pages}p"
+            log(name)
+            results[name] = run_case("pipeline", {"pdf": pdf, "latency": latency}, tempfile.mkdtemp(dir=tmp))
+        log("clean_json")
+        for name, metrics in run_case("clean_json", {"seconds": 0.5}, tmp).items():
+            results[f"clean_json.{name}"] = metrics
+    return results
+
+
+def compare(old, new):
+    """Tableau des écarts ; les métriques *_per_s sont meilleures à la hausse, les autres à la baisse."""
+    lines = []
+    for case in sorted(set(old["results"]) & set(new["results"])):
+        for metric, after in new["results"][case].items():
+            before = old["results"][case].get(metric)
+            if not isinstance(after, (int, float)) or isinstance(after, bool) or not before:
+                continue
+            delta = (after - before) / before * 100
+            better = delta > 0 if metric.endswith("_per_s") else delta < 0
+            mark = "+" if better else ("-" if abs(delta) >= 1 else " ")
+            lines.append(f"{mark} {case:<34} {metric:<22} {before:>12} -> {after:<12} ({delta:+.1f}%)")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks BAREL VOX.")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--brand-density", type=float, default=0.2)
+    parser.add_argument("--equivalent-ratio", type=float, default=0.5)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Pool de l'extraction parallèle")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latence simulée du backend stub (s)")
+    parser.add_argument("-o", "--output", help="Fichier JSON de résultats (défaut : stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("AVANT", "APRES"), help="Compare deux fichiers de résultats")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        spec = json.loads(args.child)
+        print(json.dumps(CASES[spec["case"]](spec["params"])))
+        return 0
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f_old, open(args.compare[1], encoding="utf-8") as f_new:
+            print(compare(json.load(f_old), json.load(f_new)))
+        return 0
+
+    log = lambda msg: print(f"... {msg}", file=sys.stderr, flush=True)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "child")},
+        },
+        "results": run_suite(args.pages, args.brand_density, args.equivalent_ratio, args.workers, args.latency, log),
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""Générateur de CCTP synthétiques (PDF) pour les benchmarks.
+
+    python -m benchmarks.synth out/ --pages 10 100 1000 --brand-density 0.2 --equivalent-ratio 0.5
+
+Le PDF est écrit à la main (Helvetica, WinAnsiEncoding) : aucune dépendance
+en plus de pypdf côté lecture. Même graine = même document, octet pour octet.
+"""
+import argparse
+import os
+import random
+import textwrap
+
+from barelvox.prescan import DEFAULT_BRANDS
+
+LOTS = ["Gros œuvre", "Plâtrerie", "Menuiseries extérieures", "Électricité", "Plomberie", "CVC", "Revêtements de sols"]
+PRODUCTS = ["robinetterie", "tableau électrique", "plaques de plâtre", "isolant", "menuiseries aluminium",
+            "chaudière", "revêtement PVC", "luminaires", "enduit de façade", "fenêtres de toit"]
+FILLER = [
+    "Les travaux seront exécutés conformément aux DTU en vigueur et aux règles de l'art.",
+    "L'entrepreneur devra la fourniture, le transport, la mise en œuvre et toutes sujétions.",
+    "Les échantillons seront soumis à l'approbation du maître d'œuvre avant toute commande.",
+    "Les ouvrages devront répondre aux exigences de la réglementation thermique applicable.",
+    "Le titulaire fournira les fiches techniques et procès-verbaux d'essais correspondants.",
+    "Les tolérances de planéité sont celles définies par les normes NF en vigueur.",
+    "Toute modification devra faire l'objet d'un accord écrit du maître d'ouvrage.",
+]
+LINE_WIDTH = 90
+LINES_PER_PAGE = 52
+
+
+def _paragraph(rng, brand_density, equivalent_ratio):
+    if rng.random() < brand_density:
+        brand = rng.choice(DEFAULT_BRANDS)
+        clause = " ou équivalent" if rng.random() < equivalent_ratio else ""
+        return f"Fourniture et pose de {rng.choice(PRODUCTS)} de marque {brand}{clause}. {rng.choice(FILLER)}"
+    return " ".join(rng.sample(FILLER, rng.randint(2, 4)))
+
+
+def _page_lines(rng, page_no, brand_density, equivalent_ratio):
+    lines = [f"CCTP - Lot {rng.choice(LOTS)} - Article {page_no}.1", " "]
+    article = 1
+    while len(lines) < LINES_PER_PAGE - 6:
+        if rng.random() < 0.25:
+            article += 1
+            lines += [f"Article {page_no}.{article}", " "]
+        lines += textwrap.wrap(_paragraph(rng, brand_density, equivalent_ratio), LINE_WIDTH)
+        # Ligne blanche : saut de paragraphe après extraction
+        lines.append(" ")
+    return lines
+
+
+def _escape(line):
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_cctp_pdf(pages=10, brand_density=0.2, equivalent_ratio=0.5, seed=0):
+    """PDF d'un CCTP de `pages` pages ; `brand_density` : part des paragraphes citant une marque,
+    `equivalent_ratio` : part de ces citations suivies de "ou équivalent"."""
+    rng = random.Random(seed)
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for page_no in range(1, pages + 1):
+        ops = ["BT /F1 10 Tf 50 800 Td 14 TL"]
+        ops += [f"({_escape(line)}) Tj T*" for line in _page_lines(rng, page_no, brand_density, equivalent_ratio)]
+        ops.append("ET")
+        stream = "\n".join(ops).encode("cp1252", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        kids.append(len(objects))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Génère des CCTP synthétiques (PDF).")
+    parser.add_argument("output_dir")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--brand-density", type=float, default=0.2)
+    parser.add_argument("--equivalent-ratio", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for pages in args.pages:
+        path = os.path.join(args.output_dir, f"cctp_{pages}p.pdf")
+        with open(path, "wb") as f:
+            f.write(make_cctp_pdf(pages, args.brand_density, args.equivalent_ratio, args.seed))
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
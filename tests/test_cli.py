@@ -0,0 +1,66 @@
+"""CLI batch sur le backend stub : une ligne JSONL par dossier, erreurs isolées, reprise."""
+import io
+import json
+import zipfile
+
+import pytest
+
+import barelvox.backends
+from barelvox.backends import StubBackend
+from barelvox.cli import main, run_batch
+from benchmarks.synth import make_cctp_pdf
+
+
+@pytest.fixture(autouse=True)
+def stub_backend(monkeypatch):
+    """Backend stub pour chaque test, backend du process restauré ensuite (main --backend le remplace aussi)."""
+    monkeypatch.setattr(barelvox.backends, "_backend", StubBackend())
+
+
+def read_records(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_batch_stub_and_resume(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # caches (.cache/) isolés dans le dossier du test
+    inputs = tmp_path / "dce"
+    inputs.mkdir()
+    (inputs / "a.pdf").write_bytes(make_cctp_pdf(pages=4, seed=1))
+    out = tmp_path / "out.jsonl"
+
+    assert main([str(inputs), "-o", str(out), "--backend", "stub", "-j", "1"]) == 0
+    records = read_records(out)
+    assert [r["status"] for r in records] == ["ok"]
+    assert records[0]["pages"] == 4
+    assert records[0]["verdict_flag"] in ("🟢", "🟠")
+
+    # Reprise : le PDF déjà traité est ignoré, seul le nouveau est analysé
+    (inputs / "b.pdf").write_bytes(make_cctp_pdf(pages=3, seed=2))
+    paths = sorted(str(p) for p in inputs.glob("*.pdf"))
+    assert run_batch(paths, str(out), jobs=1) == (1, 0, 1)
+    assert len(read_records(out)) == 2
+
+
+def test_batch_unreadable_file_does_not_abort(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "ok.pdf").write_bytes(make_cctp_pdf(pages=2, seed=3))
+    out = tmp_path / "out.jsonl"
+
+    assert run_batch([str(tmp_path / "absent.pdf"), str(tmp_path / "ok.pdf")], str(out), jobs=1) == (1, 1, 0)
+    records = {r["file"]: r for r in read_records(out)}
+    assert records[str(tmp_path / "absent.pdf")]["status"] == "error"
+    assert records[str(tmp_path / "ok.pdf")]["status"] == "ok"
+
+
+def test_single_pdf_zip_follows_council(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as z:
+        z.writestr("Lot 01/CCTP.pdf", make_cctp_pdf(pages=3, seed=4))
+    (tmp_path / "dce.zip").write_bytes(archive.getvalue())
+    out = tmp_path / "out.jsonl"
+
+    assert run_batch([str(tmp_path / "dce.zip")], str(out), jobs=1) == (1, 0, 0)
+    record = read_records(out)[0]
+    assert record["pages"] == 3
+    assert "documents" not in record  # pas de tri de dossier pour une pièce seule
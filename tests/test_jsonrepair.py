@@ -0,0 +1,54 @@
+"""Lecture tolérante des réponses modèle : réparations en une passe, experts complétés."""
+from barelvox.jsonrepair import parse_json
+from barelvox.trinite import validate_report
+
+
+def test_fenced_json():
+    data, repairs = parse_json('Voici :\n```json\n{"liorah": {"analyse": "RAS"}}\n```')
+    assert data == {"liorah": {"analyse": "RAS"}}
+    assert repairs == []
+
+
+def test_list_wrapper():
+    data, repairs = parse_json('[{"ethan": "RAS"}]')
+    assert data == {"ethan": "RAS"}
+    assert repairs == ["list_wrapper"]
+
+
+def test_trailing_text():
+    data, repairs = parse_json('{"krypt": "RAS"}\nJ\'espère que cela aide.')
+    assert data == {"krypt": "RAS"}
+    assert repairs == ["trailing_text"]
+
+
+def test_tail_cut_inside_string():
+    data, repairs = parse_json('{"liorah": {"analyse": "Pénalités de retard [Page 3')
+    assert data == {"liorah": {"analyse": "Pénalités de retard [Page 3"}}
+    assert repairs == ["truncated_tail"]
+
+
+def test_tail_cut_inside_array_and_object():
+    data, repairs = parse_json('{"liorah": {"analyse": "Délais", "flag": "🟠", "pages": [2, 5')
+    assert data == {"liorah": {"analyse": "Délais", "flag": "🟠", "pages": [2, 5]}}
+    assert repairs == ["truncated_tail"]
+
+
+def test_dangling_comma():
+    data, repairs = parse_json('{"liorah": {"analyse": "RAS", "flag": "🟢"}, "ethan": {"analyse": "RAS"},')
+    assert data == {"liorah": {"analyse": "RAS", "flag": "🟢"}, "ethan": {"analyse": "RAS"}}
+    assert repairs == ["truncated_tail"]
+
+
+def test_unusable_text():
+    assert parse_json("Je ne peux pas répondre.") == (None, [])
+    assert parse_json(None) == (None, [])
+
+
+def test_validate_report_fills_missing_experts():
+    report = validate_report({"liorah": "Pénalités [Page 4] et [Page 7]", "ethan": {"analyse": "RAS"}})
+    assert report["liorah"] == {"analyse": "Pénalités [Page 4] et [Page 7]", "flag": "🟠", "pages": [4, 7]}
+    assert report["ethan"] == {"analyse": "RAS", "flag": "🟢", "pages": []}
+    # Expert absent (réponse tronquée) : non évalué, pas supposé RAS
+    assert report["krypt"]["flag"] == "🟠"
+    assert report["krypt"]["analyse"].startswith("Non évalué")
+    assert validate_report({"autre": "RAS"}) is None
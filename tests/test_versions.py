@@ -0,0 +1,56 @@
+"""Addendum : pages insérées au milieu du DCE, segments réutilisés et citations renumérotées."""
+import random
+
+from barelvox.extraction import PageRecord
+from barelvox.trinite import iter_chunks, renumber_report
+from barelvox.versions import diff_pages, page_hash
+
+WORDS = "béton acier coffrage enduit isolant menuiserie étanchéité charpente réseau gaine".split()
+
+
+def make_pages(texts):
+    return [PageRecord(n, text, 0, len(text)) for n, text in enumerate(texts, start=1)]
+
+
+def page_text(seed):
+    rng = random.Random(seed)
+    return "\n\n".join(" ".join(rng.choice(WORDS) for _ in range(60)) for _ in range(6))
+
+
+def test_inserted_pages_keep_untouched_chunks():
+    old_texts = [page_text(i) for i in range(40)]
+    new_texts = old_texts[:20] + [page_text(100), page_text(101)] + old_texts[20:]
+    old = list(iter_chunks(make_pages(old_texts), budget_tokens=2000))
+    new = list(iter_chunks(make_pages(new_texts), budget_tokens=2000))
+
+    # Segments avant et après l'insertion : même empreinte, quels que soient les numéros de page
+    old_by_fp = {c.fingerprint: c for c in old}
+    reused = [c for c in new if c.fingerprint in old_by_fp]
+    assert any(c.pages[-1] < 21 for c in reused)
+    shifted = [c for c in reused if c.pages[0] > 22]
+    assert shifted
+    assert len(reused) >= len(old) - 2  # seuls les segments voisins de l'insertion changent
+
+    # Rapport d'un segment décalé : citations [Page N] et pages renumérotées (+2)
+    chunk = shifted[0]
+    before = old_by_fp[chunk.fingerprint]
+    report = {
+        "liorah": {"analyse": f"Pénalités [Page {before.pages[0]}]", "flag": "🟠", "pages": [before.pages[0]]},
+        "ethan": {"analyse": "RAS", "flag": "🟢", "pages": []},
+    }
+    renumbered = renumber_report(report, before.pages, chunk.pages)
+    assert renumbered["liorah"]["analyse"] == f"Pénalités [Page {chunk.pages[0]}]"
+    assert renumbered["liorah"]["pages"] == [before.pages[0] + 2]
+    assert renumbered["ethan"] == report["ethan"]
+
+
+def test_diff_pages_reports_inserted_pages_as_added():
+    old_texts = [page_text(i) for i in range(10)]
+    new_texts = old_texts[:5] + [page_text(100), page_text(101)] + old_texts[5:]
+    old = [(p.page, page_hash(p.text)) for p in make_pages(old_texts)]
+    new = [(p.page, page_hash(p.text)) for p in make_pages(new_texts)]
+
+    diff = diff_pages(old, new)
+    assert diff.added == [6, 7]
+    assert diff.changed == [] and diff.removed == []
+    assert diff.unchanged == 10